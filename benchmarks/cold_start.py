@@ -0,0 +1,109 @@
+"""
+Cold start benchmark for the plugin backend.
+
+Every run is a fresh interpreter that imports `main` against the stub decky
+module and awaits `Plugin._main()`, so import costs are measured as they are
+on a Steam boot. Results are printed as JSON, pass --baseline to fail when the
+median total regresses by more than --threshold.
+
+    python benchmarks/cold_start.py --runs 20 --output cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_DIR = os.path.join(ROOT, "benchmarks", "stub")
+
+_CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+plugin = main.Plugin()
+asyncio.run(plugin._main())
+done = time.perf_counter()
+plugin.update_checker.stop()
+heavy = [m for m in ("aiohttp", "upgrade", "downloader", "tarfile", "zipfile") if m in sys.modules]
+print(json.dumps({
+    "import": imported - start,
+    "main": done - imported,
+    "total": done - start,
+    "phases": plugin.startup_timings,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_once() -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="decky-bench-") as home:
+        env = dict(os.environ)
+        env["BENCH_DECKY_HOME"] = home
+        env["PYTHONPATH"] = os.pathsep.join(
+            [STUB_DIR, os.path.join(ROOT, "py_modules"), ROOT]
+        )
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        out = subprocess.run(
+            [sys.executable, "-c", _CHILD],
+            env=env,
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"runs": len(runs)}
+    for key in ("import", "main", "total"):
+        values = sorted(r[key] for r in runs)
+        result[key] = {
+            "median": statistics.median(values),
+            "min": values[0],
+            "max": values[-1],
+        }
+    phases = runs[0]["phases"].keys()
+    result["phases"] = {
+        p: statistics.median(r["phases"].get(p, 0.0) for r in runs) for p in phases
+    }
+    result["heavy_modules"] = runs[-1]["heavy_modules"]
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    result = summarize([run_once() for _ in range(args.runs)])
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        before = baseline["total"]["median"]
+        after = result["total"]["median"]
+        if after > before * (1 + args.threshold):
+            print(
+                f"cold start regressed: {before * 1000:.1f}ms -> {after * 1000:.1f}ms",
+                file=sys.stderr,
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Stand-in for the natpierce core binary.
+
+Accepts the same `-p PORT` argument, prints a startup banner like the real
+core, optionally spams `--log-mb` megabytes of log lines and then serves a
+minimal HTTP page on the controller port until SIGTERM. `-h` prints usage
+and exits.
+"""
+import argparse
+import signal
+import socket
+import sys
+import threading
+import time
+
+VERSION = "1.08"
+_RESPONSE = b"HTTP/1.0 200 OK\r\nContent-Type: text/html\r\nContent-Length: 2\r\n\r\nok"
+
+
+def _serve(sock: socket.socket) -> None:
+    while True:
+        conn, _ = sock.accept()
+        with conn:
+            conn.settimeout(1.0)
+            try:
+                conn.recv(4096)
+                conn.sendall(_RESPONSE)
+            except OSError:
+                pass
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-h", action="store_true")
+    parser.add_argument("-p", type=int, default=33272)
+    parser.add_argument("--log-mb", type=float, default=0.0)
+    parser.add_argument("--startup-delay", type=float, default=0.0)
+    args, _ = parser.parse_known_args()
+
+    if args.h:
+        print("usage: natpierce [-p port]")
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    out = sys.stdout
+    out.write(f"    natpierce fake core V{VERSION}\n")
+    out.write(f"    web controller: http://127.0.0.1:{args.p}\n")
+    out.flush()
+
+    line = "2024-01-01 00:00:00 [INFO] peer heartbeat ok, rtt 12ms, relay none\n"
+    remaining = int(args.log_mb * 1024 * 1024)
+    block = line * 1024
+    while remaining > 0:
+        out.write(block[:remaining])
+        remaining -= len(block)
+    out.flush()
+
+    time.sleep(args.startup_delay)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", args.p))
+    sock.listen(16)
+    threading.Thread(target=_serve, args=(sock,), daemon=True).start()
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Local HTTP file server for the benchmarks, with single range support so the
+segmented downloader can be exercised like against a real CDN.
+"""
+from contextlib import contextmanager
+from functools import partial
+import http.server
+import os
+import re
+import threading
+from typing import Iterator, Optional, Tuple, Type
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _parse_range(self, size: int) -> Optional[Tuple[int, int]]:
+        match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if not match:
+            return None
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        return start, min(end, size - 1)
+
+    def do_GET(self) -> None:
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        byte_range = self._parse_range(size)
+        start, end = byte_range if byte_range else (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(256 * 1024, remaining))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                remaining -= len(chunk)
+
+
+@contextmanager
+def serve(
+    directory: str, handler_class: Type[RangeRequestHandler] = RangeRequestHandler
+) -> Iterator[str]:
+    """Serve directory on a free local port, yields the base URL"""
+    handler = partial(handler_class, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,135 @@
+"""
+Checks latency.LatencyHistogram and the UDP/TCP probes against a fake peer.
+
+A local UDP echo peer answers every probe after a delay drawn from a known
+distribution, and a TCP listener accepts handshakes. The histogram
+percentiles are compared with the exact percentiles of the same samples,
+they must agree within the histogram's bucket resolution. Synthetic samples
+are checked the same way without any network. Results are printed as JSON
+and the exit status is non-zero on a mismatch.
+
+    python benchmarks/latency_harness.py --probes 200
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "benchmarks", "stub"), os.path.join(ROOT, "py_modules")]
+
+import latency  # noqa: E402
+
+PERCENTILES = (50, 95, 99)
+# a value is reported from the middle of its log bucket
+TOLERANCE = latency.LatencyHistogram.GROWTH - 1
+
+
+def exact_percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(len(ordered) * p / 100))
+    return ordered[rank - 1]
+
+
+def compare(samples: List[float], histogram: latency.LatencyHistogram) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"count": histogram.count, "ok": True}
+    for p in PERCENTILES:
+        exact = exact_percentile(samples, p)
+        approx = histogram.percentile(p)
+        assert approx is not None
+        error = abs(approx - exact) / exact
+        result[f"p{p}"] = {"exact": exact, "histogram": approx, "error": error}
+        if error > TOLERANCE:
+            result["ok"] = False
+    return result
+
+
+def check_synthetic(count: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    samples = [rng.lognormvariate(math.log(20), 0.8) for _ in range(count)]
+    histogram = latency.LatencyHistogram()
+    for ms in samples:
+        histogram.record(ms)
+    return compare(samples, histogram)
+
+
+class EchoPeer(asyncio.DatagramProtocol):
+    """Echoes each datagram after a random delay"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        delay = self.rng.uniform(0.002, 0.030)
+        asyncio.get_running_loop().call_later(delay, self._reply, data, addr)
+
+    def _reply(self, data: bytes, addr: Any) -> None:
+        if self.transport is not None:
+            self.transport.sendto(data, addr)
+
+
+async def check_probes(count: int, seed: int) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: EchoPeer(random.Random(seed)), local_addr=("127.0.0.1", 0)
+    )
+    udp_port = transport.get_extra_info("sockname")[1]
+    server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+    tcp_port = server.sockets[0].getsockname()[1]
+    try:
+        results: Dict[str, Any] = {}
+        for proto, probe, port in (
+            ("udp", latency.udp_rtt, udp_port),
+            ("tcp", latency.tcp_rtt, tcp_port),
+        ):
+            samples: List[float] = []
+            histogram = latency.LatencyHistogram()
+            # concurrent probes, like LatencyProber runs them
+            for batch in range(0, count, 20):
+                rtts = await asyncio.gather(
+                    *(probe("127.0.0.1", port, 2.0) for _ in range(min(20, count - batch)))
+                )
+                for rtt in rtts:
+                    if rtt is None:
+                        histogram.record_loss()
+                    else:
+                        samples.append(rtt)
+                        histogram.record(rtt)
+            results[proto] = compare(samples, histogram) if samples else {"ok": False}
+            results[proto]["lost"] = histogram.lost
+            results[proto]["ok"] = results[proto]["ok"] and histogram.lost == 0
+        return results
+    finally:
+        transport.close()
+        server.close()
+        await server.wait_closed()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    result = {
+        "tolerance": TOLERANCE,
+        "synthetic": check_synthetic(args.samples, args.seed),
+        "probes": asyncio.run(check_probes(args.probes, args.seed)),
+    }
+    ok = result["synthetic"]["ok"] and all(r["ok"] for r in result["probes"].values())
+    result["ok"] = ok
+    print(json.dumps(result, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Benchmark suite for the plugin backend hot paths.
+
+Runs against the stub decky module, a fake natpierce binary and a local HTTP
+server, nothing touches the network or the real plugin directories:
+
+    cold_start     Plugin._main in fresh interpreters (see cold_start.py)
+    core           CoreController.start / stop latency and get_version
+    core_log       core log capture throughput for a large log, then get_version
+    get_ip         Plugin.get_ip from the netlink table and the legacy fallback
+    download       downloader.download_with_progress throughput
+    upgrade_core   upgrade.upgrade_core end to end, cold and from the cache
+
+Results are written as JSON. With --baseline every "*_s" timing that got
+slower than --threshold is reported and the exit status is non-zero.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --only core,download --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tarfile
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+# the stub decky module reads its paths at import time
+os.environ.setdefault("BENCH_DECKY_HOME", tempfile.mkdtemp(prefix="decky-bench-"))
+sys.path[:0] = [os.path.join(BENCH_DIR, "stub"), os.path.join(ROOT, "py_modules"), ROOT, BENCH_DIR]
+
+import decky  # noqa: E402
+import cold_start  # noqa: E402
+from http_server import serve  # noqa: E402
+
+Result = Dict[str, Any]
+
+
+def timings(values: List[float]) -> Result:
+    ordered = sorted(values)
+    return {
+        "runs": len(ordered),
+        "median_s": statistics.median(ordered),
+        "min_s": ordered[0],
+        "max_s": ordered[-1],
+    }
+
+
+def install_fake_core(path: str) -> None:
+    """A wrapper around fake_natpierce.py, extra arguments come from
+    FAKE_NATPIERCE_ARGS so benchmarks can change its behaviour"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(
+            "#!/bin/sh\n"
+            f'exec "{sys.executable}" "{os.path.join(BENCH_DIR, "fake_natpierce.py")}" '
+            '"$@" $FAKE_NATPIERCE_ARGS\n'
+        )
+    os.chmod(path, 0o755)
+
+
+async def bench_cold_start(args: argparse.Namespace) -> Result:
+    runs = [await asyncio.to_thread(cold_start.run_once) for _ in range(args.runs)]
+    result = cold_start.summarize(runs)
+    for key in ("import", "main", "total"):
+        result[f"{key}_s"] = result[key]["median"]
+    return result
+
+
+async def bench_core(args: argparse.Namespace) -> Result:
+    from core import CoreController
+
+    install_fake_core(CoreController.CORE_PATH)
+    controller = CoreController()
+    starts, stops, versions = [], [], []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        await controller.start()
+        starts.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        version = await controller.get_version()
+        versions.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await controller.stop()
+        stops.append(time.perf_counter() - started)
+    return {
+        "start": timings(starts),
+        "stop": timings(stops),
+        "get_version": timings(versions),
+        "version": version,
+    }
+
+
+async def bench_core_log(args: argparse.Namespace) -> Result:
+    from core import CoreController
+
+    install_fake_core(CoreController.CORE_PATH)
+    controller = CoreController()
+    os.environ["FAKE_NATPIERCE_ARGS"] = f"--log-mb {args.log_mb}"
+    try:
+        started = time.perf_counter()
+        await controller.start()
+        ready = time.perf_counter() - started
+        calls = []
+        for _ in range(args.runs):
+            call_started = time.perf_counter()
+            version = await controller.get_version()
+            calls.append(time.perf_counter() - call_started)
+        await controller.stop()
+        captured = time.perf_counter() - started
+    finally:
+        os.environ.pop("FAKE_NATPIERCE_ARGS", None)
+    return {
+        "log_mb": args.log_mb,
+        "start_s": ready,
+        "capture_s": captured,
+        "capture_mb_per_s": args.log_mb / captured if captured else None,
+        "get_version": timings(calls),
+        "version": version,
+    }
+
+
+async def bench_get_ip(args: argparse.Namespace) -> Result:
+    import main
+
+    plugin = main.Plugin()
+    await plugin._main()
+    result: Result = {}
+    try:
+        for name, call in (
+            ("netmon", plugin.get_ip),
+            ("fallback", lambda: asyncio.to_thread(main.utils.get_ip)),
+        ):
+            values = []
+            for _ in range(args.runs * 10):
+                started = time.perf_counter()
+                ip = await call()
+                values.append(time.perf_counter() - started)
+            result[name] = {**timings(values), "ip": ip}
+    finally:
+        await plugin._unload()
+    return result
+
+
+async def _no_progress(percent: int) -> None:
+    pass
+
+
+async def bench_download(args: argparse.Namespace) -> Result:
+    import downloader
+    import http_client
+
+    result: Result = {"size_mb": args.download_mb}
+    with tempfile.TemporaryDirectory(prefix="bench-www-") as www:
+        with open(os.path.join(www, "blob.bin"), "wb") as f:
+            for _ in range(int(args.download_mb)):
+                f.write(os.urandom(1024 * 1024))
+        with serve(www) as base_url, tempfile.TemporaryDirectory() as dest_dir:
+            for segments in (1, 4):
+                values = []
+                for run in range(args.runs):
+                    started = time.perf_counter()
+                    path = await downloader.download_with_progress(
+                        f"{base_url}/blob.bin",
+                        f"blob-{segments}-{run}.bin",
+                        _no_progress,
+                        segments=segments,
+                        dest_dir=dest_dir,
+                    )
+                    values.append(time.perf_counter() - started)
+                    os.remove(path)
+                stats = timings(values)
+                stats["mb_per_s"] = args.download_mb / stats["median_s"]
+                result[f"segments_{segments}"] = stats
+    await http_client.close()
+    return result
+
+
+async def bench_upgrade_core(args: argparse.Namespace) -> Result:
+    import http_client
+    from metadata import ResourceType
+    import upgrade
+
+    result: Result = {}
+    with tempfile.TemporaryDirectory(prefix="bench-www-") as www:
+        fake = os.path.join(www, "natpierce")
+        install_fake_core(fake)
+        with tarfile.open(os.path.join(www, "natpierce.tar.gz"), "w:gz") as tar:
+            tar.add(fake, arcname="natpierce")
+        with serve(www) as base_url:
+            url_map = dict(upgrade._URL_MAP)
+            upgrade._URL_MAP[ResourceType.CORE] = lambda ver: f"{base_url}/natpierce.tar.gz"
+            # the fake core is a shell script rather than an ELF binary
+            check_core_binary = upgrade._check_core_binary
+            upgrade._check_core_binary = lambda path: None
+            cache_root = upgrade._get_cache().root
+            try:
+                cold, warm = [], []
+                for run in range(args.runs):
+                    shutil.rmtree(cache_root, ignore_errors=True)
+                    upgrade._cache = None
+                    for values in (cold, warm):
+                        started = time.perf_counter()
+                        await upgrade.upgrade_core(f"v1.{run:02d}")
+                        values.append(time.perf_counter() - started)
+                result["cache_miss"] = timings(cold)
+                result["cache_hit"] = timings(warm)
+            finally:
+                upgrade._URL_MAP.clear()
+                upgrade._URL_MAP.update(url_map)
+                upgrade._check_core_binary = check_core_binary
+    await http_client.close()
+    return result
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Awaitable[Result]]] = {
+    "cold_start": bench_cold_start,
+    "core": bench_core,
+    "core_log": bench_core_log,
+    "get_ip": bench_get_ip,
+    "download": bench_download,
+    "upgrade_core": bench_upgrade_core,
+}
+
+
+def _regressions(
+    baseline: Any, current: Any, threshold: float, path: str = ""
+) -> List[str]:
+    found = []
+    if isinstance(baseline, dict) and isinstance(current, dict):
+        for key, value in baseline.items():
+            if key in current:
+                found += _regressions(value, current[key], threshold, f"{path}.{key}" if path else key)
+    elif (
+        path.endswith("_s")
+        and isinstance(baseline, (int, float))
+        and isinstance(current, (int, float))
+        and current > baseline * (1 + threshold)
+    ):
+        found.append(f"{path}: {baseline * 1000:.2f}ms -> {current * 1000:.2f}ms")
+    return found
+
+
+async def run(args: argparse.Namespace, names: List[str]) -> Result:
+    results: Result = {}
+    for name in names:
+        print(f"running {name} ...", file=sys.stderr)
+        try:
+            results[name] = await BENCHMARKS[name](args)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", help="comma separated benchmarks to run")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--log-mb", type=float, default=256)
+    parser.add_argument("--download-mb", type=float, default=64)
+    parser.add_argument("--output", help="write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    started = time.time()
+    results = asyncio.run(run(args, names))
+    output = {
+        "meta": {
+            "time": started,
+            "duration_s": time.time() - started,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "decky_home": decky.HOME,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(output, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    failed = [name for name, result in results.items() if "error" in result]
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = _regressions(baseline["results"], results, args.threshold)
+        for line in regressions:
+            print(f"regressed: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Minimal stand-in for the `decky` module provided by the plugin loader, see
+`decky.pyi`. Every path lives under BENCH_DECKY_HOME (a fresh temp dir when
+unset) and emitted events are recorded in `events`.
+"""
+import getpass
+import logging
+import os
+import tempfile
+from typing import Any, List, Tuple
+
+__version__ = "1.0.0"
+
+_home = os.environ.get("BENCH_DECKY_HOME") or tempfile.mkdtemp(prefix="decky-bench-")
+
+HOME = _home
+USER = getpass.getuser()
+DECKY_VERSION = "v3.0.0-bench"
+DECKY_USER = USER
+DECKY_USER_HOME = _home
+DECKY_HOME = os.path.join(_home, "homebrew")
+DECKY_PLUGIN_NAME = "decky-natpierce"
+DECKY_PLUGIN_VERSION = "0.0.0"
+DECKY_PLUGIN_AUTHOR = "bench"
+DECKY_PLUGIN_DIR = os.environ.get(
+    "BENCH_DECKY_PLUGIN_DIR", os.path.join(DECKY_HOME, "plugins", DECKY_PLUGIN_NAME)
+)
+DECKY_PLUGIN_SETTINGS_DIR = os.path.join(DECKY_HOME, "settings", DECKY_PLUGIN_NAME)
+DECKY_PLUGIN_RUNTIME_DIR = os.path.join(DECKY_HOME, "data", DECKY_PLUGIN_NAME)
+DECKY_PLUGIN_LOG_DIR = os.path.join(DECKY_HOME, "logs", DECKY_PLUGIN_NAME)
+DECKY_PLUGIN_LOG = os.path.join(DECKY_PLUGIN_LOG_DIR, "plugin.log")
+
+for _path in (
+    DECKY_PLUGIN_DIR,
+    DECKY_PLUGIN_SETTINGS_DIR,
+    DECKY_PLUGIN_RUNTIME_DIR,
+    DECKY_PLUGIN_LOG_DIR,
+):
+    os.makedirs(_path, exist_ok=True)
+
+logger = logging.getLogger("decky-bench")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+events: List[Tuple[str, Tuple[Any, ...]]] = []
+
+
+async def emit(event: str, *args: Any) -> None:
+    events.append((event, args))
+
+
+def migrate_any(target_dir: str, *files_or_directories: str) -> dict[str, str]:
+    return {}
+
+
+def migrate_settings(*files_or_directories: str) -> dict[str, str]:
+    return {}
+
+
+def migrate_runtime(*files_or_directories: str) -> dict[str, str]:
+    return {}
+
+
+def migrate_logs(*files_or_directories: str) -> dict[str, str]:
+    return {}
@@ -0,0 +1,251 @@
+"""
+Checks update_checker.UpdateChecker against a local HTTP stand-in for the
+release endpoints and a fake clock.
+
+The checker's sleep is replaced by a clock that only moves when the harness
+advances it, so the initial delay, the jittered interval and every check
+can be stepped through without waiting. Scenarios:
+
+    notify        a new core release is announced once and prefetched
+    new_release   a later release is announced again
+    prefetch_fail a failing artifact download still announces the release
+    shared        a download started during a prefetch joins it, the
+                  artifact is fetched from the server only once
+    cancel        cancelling the only waiter cancels the download
+
+Results are printed as JSON and the exit status is non-zero on a failure.
+
+    python benchmarks/update_checker_harness.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+os.environ.setdefault("BENCH_DECKY_HOME", tempfile.mkdtemp(prefix="decky-bench-"))
+sys.path[:0] = [os.path.join(BENCH_DIR, "stub"), os.path.join(ROOT, "py_modules"), BENCH_DIR]
+
+import decky  # noqa: E402
+from http_server import RangeRequestHandler, serve  # noqa: E402
+
+Result = Dict[str, Any]
+
+
+class ReleaseHandler(RangeRequestHandler):
+    """Records every request, answers paths in `failing` with a 500 and
+    delays artifact bodies by `delay` seconds"""
+
+    requests: List[Dict[str, str]] = []
+    failing: Set[str] = set()
+    delay = 0.0
+    _lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        with self._lock:
+            self.requests.append({"path": self.path, "range": self.headers.get("Range", "")})
+        if self.path in self.failing:
+            self.send_error(500)
+            return
+        if self.delay and self.headers.get("Range") != "bytes=0-0":
+            time.sleep(self.delay)
+        super().do_GET()
+
+    @classmethod
+    def probes(cls, path: str) -> int:
+        """Number of downloads started for path, each begins with one probe"""
+        return sum(1 for r in cls.requests if r["path"] == path and r["range"] == "bytes=0-0")
+
+
+class FakeClock:
+    """Stand-in for asyncio.sleep, a sleep only returns once advance() is
+    called, the requested delays are recorded"""
+
+    def __init__(self):
+        self.sleeps: List[float] = []
+        self._wake: Optional[asyncio.Future] = None
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        self._wake = asyncio.get_running_loop().create_future()
+        await self._wake
+
+    async def wait_asleep(self, timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + timeout
+        while self._wake is None or self._wake.done():
+            if time.monotonic() > deadline:
+                raise TimeoutError("checker did not go to sleep")
+            await asyncio.sleep(0.01)
+
+    async def advance(self) -> None:
+        """Wake the sleeping checker and wait until it sleeps again"""
+        await self.wait_asleep()
+        assert self._wake is not None
+        self._wake.set_result(None)
+        await asyncio.sleep(0)
+        await self.wait_asleep()
+
+
+def write_core_tarball(path: str, version: str) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = os.path.join(tmp, "natpierce")
+        with open(binary, "w") as f:
+            f.write(f"#!/bin/sh\necho natpierce {version}\n")
+        os.chmod(binary, 0o755)
+        with tarfile.open(path, "w:gz") as tar:
+            tar.add(binary, arcname="natpierce")
+
+
+def update_events() -> List[Dict[str, Any]]:
+    return [args[0] for event, args in decky.events if event == "update_available"]
+
+
+def check(result: Result, name: str, ok: bool, **details: Any) -> None:
+    result[name] = {"ok": ok, **details}
+
+
+async def run(www: str, base_url: str) -> Result:
+    from metadata import ResourceType
+    from setting import get_settings
+    import http_client
+    import update_checker
+    import upgrade
+    import versions
+
+    with open(os.path.join(www, "version.html"), "w") as f:
+        f.write("2.00")
+    with open(os.path.join(www, "latest.json"), "w") as f:
+        json.dump({"tag_name": "v" + decky.DECKY_PLUGIN_VERSION}, f)
+    write_core_tarball(os.path.join(www, "core-v2.00.tar.gz"), "v2.00")
+    write_core_tarball(os.path.join(www, "core-v2.01.tar.gz"), "v2.01")
+    with open(os.path.join(www, "plugin-v9.0.zip"), "wb") as f:
+        f.write(os.urandom(2 * 1024 * 1024))
+
+    versions.CORE_VERSION_URL = f"{base_url}/version.html"
+    versions.get_latest_release_url = lambda repo: f"{base_url}/latest.json"
+    upgrade._URL_MAP[ResourceType.CORE] = lambda ver: f"{base_url}/core-{ver}.tar.gz"
+    upgrade._URL_MAP[ResourceType.PLUGIN] = lambda ver: f"{base_url}/plugin-{ver}.zip"
+
+    settings = get_settings()
+    settings.setSetting("core_version", "v1.00")
+    settings.setSetting("prefetch_update", True)
+    settings.setSetting("debounce_time", 0)
+    interval = float(settings.getSetting("update_check_interval"))
+
+    result: Result = {}
+    clock = FakeClock()
+    checker = update_checker.UpdateChecker(settings, sleep=clock.sleep)
+    checker.start()
+    try:
+        await clock.wait_asleep()
+        initial = clock.sleeps[0]
+        jitter = update_checker.UpdateChecker.JITTER
+        delay_ok = abs(initial - checker.INITIAL_DELAY) <= checker.INITIAL_DELAY * jitter
+
+        await clock.advance()
+        events = update_events()
+        core_url = upgrade._URL_MAP[ResourceType.CORE]("v2.00")
+        cached = upgrade._get_cache().lookup(core_url, "v2.00")
+        interval_ok = abs(clock.sleeps[-1] - interval) <= interval * jitter
+        check(
+            result,
+            "notify",
+            delay_ok
+            and interval_ok
+            and len(events) == 1
+            and events[0]["latest"] == "v2.00"
+            and events[0]["prefetched"]
+            and cached is not None,
+            sleeps=list(clock.sleeps),
+            events=events,
+        )
+
+        await clock.advance()
+        repeated = len(update_events()) == 1
+
+        with open(os.path.join(www, "version.html"), "w") as f:
+            f.write("2.01")
+        await clock.advance()
+        events = update_events()
+        check(
+            result,
+            "new_release",
+            repeated and len(events) == 2 and events[1]["latest"] == "v2.01",
+            events=events,
+        )
+
+        with open(os.path.join(www, "version.html"), "w") as f:
+            f.write("3.00")
+        ReleaseHandler.failing.add("/core-v3.00.tar.gz")
+        await clock.advance()
+        events = update_events()
+        check(
+            result,
+            "prefetch_fail",
+            len(events) == 3 and events[2]["latest"] == "v3.00" and not events[2]["prefetched"],
+            events=events,
+        )
+    finally:
+        checker.stop()
+
+    ReleaseHandler.delay = 0.3
+    progress: List[int] = []
+
+    async def record(percent: int) -> None:
+        progress.append(percent)
+
+    prefetch = asyncio.create_task(upgrade.prefetch(ResourceType.PLUGIN, "v9.0"))
+    await asyncio.sleep(0.1)
+    path = await upgrade.download_resourse(ResourceType.PLUGIN, "v9.0", record)
+    await prefetch
+    check(
+        result,
+        "shared",
+        ReleaseHandler.probes("/plugin-v9.0.zip") == 1
+        and os.path.exists(path)
+        and progress[-1:] == [-1],
+        downloads=ReleaseHandler.probes("/plugin-v9.0.zip"),
+        progress_events=len(progress),
+    )
+
+    ReleaseHandler.delay = 1.0
+    with open(os.path.join(www, "plugin-v9.1.zip"), "wb") as f:
+        f.write(os.urandom(1024 * 1024))
+    waiter = asyncio.create_task(upgrade.download_resourse(ResourceType.PLUGIN, "v9.1", record))
+    await asyncio.sleep(0.2)
+    fetch = upgrade._fetches.get((ResourceType.PLUGIN, "v9.1"))
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    await asyncio.sleep(0.05)
+    check(
+        result,
+        "cancel",
+        fetch is not None
+        and fetch.task is not None
+        and fetch.task.cancelled()
+        and (ResourceType.PLUGIN, "v9.1") not in upgrade._fetches,
+    )
+    ReleaseHandler.delay = 0.0
+
+    await http_client.close()
+    return result
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory(prefix="bench-www-") as www:
+        with serve(www, ReleaseHandler) as base_url:
+            result = asyncio.run(run(www, base_url))
+    result["ok"] = all(r["ok"] for r in result.values())
+    print(json.dumps(result, indent=2))
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,44 +1,104 @@
-from typing import Any, Optional, Tuple
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
 import decky
 from core import CoreController
-from setting import Settings
+from setting import SCHEMA, get_settings
 from decky import logger
-from metadata import DEFAILT_PORT, PACKAGE_NAME
-import upgrade
+from metadata import PACKAGE_NAME, RESOURCE_TYPE_ENUMS, RESOURCE_TYPE_VALUES, ResourceType
+import http_client
+from health import HealthMonitor, scan_tun_interfaces
+import instrument
+from latency import LatencyProber
+from metrics import MetricsSampler
+from netmon import NetworkMonitor
+from update_checker import UpdateChecker
 import utils
+import versions
 
 import logging
 
+# upgrade (archives, downloads, aiohttp) is imported on first use only, it is
+# not needed on a normal boot
 
+
+@instrument.instrument_methods("rpc")
 class Plugin:
     async def _main(self):
-        self.settings = Settings()
         logger.info(f"starting {PACKAGE_NAME} ...")
+        self.startup_timings: Dict[str, float] = {}
+        last = start = time.perf_counter()
+
+        def phase(name: str) -> None:
+            nonlocal last
+            now = time.perf_counter()
+            self.startup_timings[name] = now - last
+            last = now
 
-        self._set_default("timeout", 15.0)
-        self._set_default("debounce_time", 10.0)
-        self._set_default("autostart", False)
-        self._set_default("controller_port", DEFAILT_PORT)
-        self._set_default("costom_port", False)
-        self._set_default("auto_check_update", True)
-        self._set_default("disable_verify", False)
-        self._set_default("core_version", "")
-        self._set_default("log_level", logging.getLevelName(logging.INFO))
+        self.settings = get_settings()
+        phase("settings")
 
         level = self._get("log_level")
         logger.setLevel(logging.getLevelNamesMapping()[level])
         logger.info(f"log level set to {level}")
 
         utils.init_ssl_context(self._get("disable_verify"))
+        phase("ssl")
+
+        self._configure_instrumentation()
+        self.settings.subscribe("instrumentation", self._configure_instrumentation)
+        self.settings.subscribe("instrumentation_span_log", self._configure_instrumentation)
 
         self.core = CoreController()
         self.core.set_exit_callback(lambda x: decky.emit("core_exit", x))
+        self.core.set_state_callback(lambda x: decky.emit("core_state", x))
+        phase("core")
+        self.netmon = NetworkMonitor()
+        self.netmon.set_change_callback(lambda x: decky.emit("ip_changed", x))
+        self.netmon.start()
+        phase("netmon")
+        self.health = HealthMonitor(
+            self.core, self.settings, tun_interfaces=self._tun_interfaces
+        )
+        self.health.set_callback(lambda x: decky.emit("core_health", x))
+        self.health.start()
+        phase("health")
+        self.metrics = MetricsSampler(
+            self.core, self.settings, tun_interfaces=self._tun_interfaces
+        )
+        self.metrics.set_callback(lambda x: decky.emit("core_metrics", x))
+        self.metrics.start()
+        phase("metrics")
+        self.latency = LatencyProber(
+            self.core, self.settings, tun_interfaces=self._tun_interfaces
+        )
+        self.latency.start()
+        phase("latency")
+        self.update_checker = UpdateChecker(self.settings)
+        self.update_checker.start()
+        phase("update_checker")
+
         if self._get("autostart"):
             await self.core.start()
+            phase("autostart")
+
+        self.startup_timings["total"] = time.perf_counter() - start
+        logger.info(
+            "startup timings: "
+            + ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in self.startup_timings.items())
+        )
 
     async def _unload(self):
+        self.update_checker.stop()
+        self.netmon.stop()
+        self.health.stop()
+        self.metrics.stop()
+        self.latency.stop()
         if self.core.is_running:
             await self.core.stop()
+        self.settings.flush()
+        await http_client.close()
+        instrument.close()
 
     async def _uninstall(self):
         if self.core.is_running:
@@ -46,9 +106,46 @@ class Plugin:
 
     async def get_core_status(self) -> bool:
         is_running = self.core.is_running
-        logger.debug(f"get_core_status: {is_running}")
+        logger.debug("get_core_status: %s", is_running)
         return is_running
 
+    async def get_core_state(self) -> dict:
+        return self.core.snapshot()
+
+    async def get_precheck_report(self, refresh: bool = False) -> dict:
+        if refresh or not self.core.precheck_report:
+            return await self.core.run_precheck()
+        return self.core.precheck_report
+
+    async def get_health(self, refresh: bool = False) -> dict:
+        if refresh:
+            return await self.health.check()
+        return self.health.report()
+
+    async def get_metrics(self, limit: int = 60) -> dict:
+        return self.metrics.report(limit)
+
+    async def set_game_running(self, running: bool) -> None:
+        self.core.set_game_running(bool(running))
+
+    async def get_core_policy(self) -> Optional[dict]:
+        return self.core.policy
+
+    def _configure_instrumentation(self, *_: Any) -> None:
+        instrument.configure(
+            bool(self._get("instrumentation")),
+            bool(self._get("instrumentation_span_log")),
+        )
+
+    async def get_instrumentation(self, reset: bool = False) -> dict:
+        return instrument.snapshot(reset)
+
+    async def get_recent_spans(self, limit: int = 50) -> list:
+        return instrument.recent_spans(limit)
+
+    async def get_core_log(self, before: Optional[int] = None, limit: int = 100) -> dict:
+        return self.core.get_log_lines(before, limit)
+
     async def set_core_status(self, status: bool) -> Tuple[bool, Optional[str]]:
         try:
             if status:
@@ -60,11 +157,17 @@ class Plugin:
             return False, str(e)
         return True, None
 
+    async def get_startup_timings(self) -> Dict[str, float]:
+        return self.startup_timings
+
     async def upgrade(self, res: str, version: str) -> Tuple[bool, Optional[str]]:
-        if res not in upgrade.RESOURCE_TYPE_VALUES:
+        import upgrade
+
+        if res not in RESOURCE_TYPE_VALUES:
             logger.error(f"upgrade: invalid resource {res}")
             return False, "invalid resource"
-        res_type = upgrade.ResourceType(res)
+        res_type = ResourceType(res)
+        upgrade.set_core_controller(self.core)
         try:
             await upgrade.upgrade(res_type, version)
         except Exception as e:
@@ -73,10 +176,12 @@ class Plugin:
         return True, None
 
     async def cancel_upgrade(self, res: str) -> None:
-        if res not in upgrade.RESOURCE_TYPE_VALUES:
+        import upgrade
+
+        if res not in RESOURCE_TYPE_VALUES:
             logger.error(f"cancel_upgrade: invalid resource {res}")
             return
-        res_type = upgrade.ResourceType(res)
+        res_type = ResourceType(res)
         upgrade.cancel_upgrade(res_type)
 
     async def get_config(self) -> dict:
@@ -85,56 +190,118 @@ class Plugin:
             "autostart": self._get("autostart"),
             "controller_port": self._get("controller_port"),
             "costom_port": self._get("costom_port"),
+            "port": self.core.port,
+            "supervise": self.core.supervised,
+            "restart_count": self.core.restart_count,
+            "last_exit_code": self.core.last_exit_code,
+            "uptime": self.core.uptime,
         }
-        logger.info(f"get_config: {config}")
+        logger.debug("get_config: %s", config)
         return config
 
     async def get_config_value(self, key: str):
-        logger.info(f"get_config_value: {key}")
         value = self.settings.getSetting(key)
-        logger.info(f"get_config_value: {key} => {value}")
+        logger.debug("get_config_value: %s => %s", key, value)
         return value
 
-    async def set_config_value(self, key: str, value: Any):
-        self.settings.setSetting(key, value)
-        logger.info(f"set_config_value: {key} => {value}")
+    async def set_config_value(self, key: str, value: Any) -> Tuple[bool, Optional[str]]:
+        try:
+            self.settings.setSetting(key, value)
+        except (TypeError, ValueError) as e:
+            logger.error(f"set_config_value: {key} failed with {e}")
+            return False, str(e)
+        logger.info("set_config_value: %s => %s", key, value)
+        return True, None
+
+    async def set_config_values(self, values: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        unknown = [key for key in values if key not in SCHEMA]
+        if unknown:
+            logger.error(f"set_config_values: unknown keys {unknown}")
+            return False, f"unknown keys: {', '.join(unknown)}"
+        try:
+            self.settings.setSettings(values)
+        except (TypeError, ValueError) as e:
+            logger.error(f"set_config_values: failed with {e}")
+            return False, str(e)
+        logger.info("set_config_values: %s", values)
+        return True, None
+
+    async def get_state(self) -> dict:
+        """Everything the panel renders, in one call"""
+        state = {
+            "stamp": f"{self.settings.revision}:{self.core.state_since}",
+            "config": await self.get_config(),
+            "settings": self.settings.to_dict(),
+            "core": self.core.snapshot(),
+            "version": {
+                ResourceType.PLUGIN.value: await self.get_version(
+                    ResourceType.PLUGIN.value
+                ),
+                ResourceType.CORE.value: await self.get_version(
+                    ResourceType.CORE.value
+                ),
+            },
+            "latest_version": {
+                res.value: versions.get_cached_latest_version(res)
+                for res in RESOURCE_TYPE_ENUMS
+            },
+            "ip": await self.get_ip(),
+        }
+        return state
 
     async def get_version(self, res: str) -> str:
-        if res not in upgrade.RESOURCE_TYPE_VALUES:
+        if res not in RESOURCE_TYPE_VALUES:
             logger.error(f"get_version: invalid resource {res}")
             return ""
-        res_type = upgrade.ResourceType(res)
+        res_type = ResourceType(res)
         try:
             match res_type:
-                case upgrade.ResourceType.PLUGIN:
-                    version = decky.DECKY_PLUGIN_VERSION
-                    if version[0].isdigit():
-                        version = "v" + version
-                case upgrade.ResourceType.CORE:
+                case ResourceType.PLUGIN:
+                    version = versions.get_current_version(res_type)
+                case ResourceType.CORE:
                     version = await self.core.get_version()
         except Exception as e:
             logger.error(f"get_version: {res} failed with {type(e)} {e}")
             return ""
-        logger.debug(f"get_version: {res} {version}")
+        logger.debug("get_version: %s %s", res, version)
         return version
 
     async def get_latest_version(self, res: str) -> str:
-        if res not in upgrade.RESOURCE_TYPE_VALUES:
+        if res not in RESOURCE_TYPE_VALUES:
             logger.error(f"get_latest_version: invalid resource {res}")
             return ""
-        res_type = upgrade.ResourceType(res)
+        res_type = ResourceType(res)
         try:
-            version = await upgrade.get_latest_version(
+            version = await versions.get_latest_version(
                 res_type, self._get("timeout"), self._get("debounce_time")
             )
         except Exception as e:
             logger.error(f"get_latest_version: failed with {e}")
             return ""
-        logger.debug(f"get_latest_version: {res} {version}")
+        logger.debug("get_latest_version: %s %s", res, version)
         return version
 
     async def get_ip(self) -> str:
-        return utils.get_ip()
+        ip = self.netmon.primary_ip() if self.netmon.running else None
+        if ip is None:
+            # netlink unavailable or no address yet, the fallbacks may block on a socket
+            ip = await asyncio.to_thread(utils.get_ip)
+        return ip
+
+    async def get_network_info(self) -> dict:
+        return self.netmon.snapshot()
+
+    async def get_latency(self, refresh: bool = False, reset: bool = False) -> dict:
+        if reset:
+            self.latency.reset()
+        if refresh:
+            return await self.latency.probe_all()
+        return self.latency.report()
+
+    def _tun_interfaces(self) -> List[str]:
+        if not self.netmon.running:
+            return scan_tun_interfaces()
+        return list(dict.fromkeys(e["ifname"] for e in self.netmon.tun_addresses()))
 
     def _get(self, key: str, allow_none: bool = False) -> Any:
         if allow_none:
@@ -145,10 +312,6 @@ class Plugin:
                 raise ValueError(f'Value of "{key}" is None')
             return value
 
-    def _set_default(self, key: str, value: Any) -> None:
-        if not self.settings.getSetting(key):
-            self.settings.setSetting(key, value)
-
     # async def _migration(self):
     #     decky.logger.info("Migrating")
     #     decky.migrate_logs(os.path.join(decky.DECKY_USER_HOME,
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import decky
+from decky import logger
+
+CACHE_DIR = os.path.join(decky.DECKY_PLUGIN_RUNTIME_DIR, "cache")
+DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadCache:
+    """Content-addressed cache for downloaded artifacts.
+
+    Blobs are stored by their SHA-256 digest and indexed by url and version.
+    The digest is verified before a blob is handed out, and the least recently
+    used entries are evicted once the cache grows beyond max_size. Lookups and
+    stores run in worker threads, the index and blob files are guarded by a
+    lock.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_size: int = DEFAULT_MAX_SIZE):
+        self.root = root
+        self.max_size = max_size
+        self._blob_dir = os.path.join(root, "blobs")
+        self._index_path = os.path.join(root, "index.json")
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url: str, version: str) -> str:
+        return hashlib.sha256(f"{url}\n{version}".encode()).hexdigest()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._blob_dir, digest)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"cache index is invalid, starting empty: {e}")
+            return {}
+
+    def _save_index(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _drop(self, key: str) -> None:
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        digest = entry["sha256"]
+        if not any(e["sha256"] == digest for e in self._index.values()):
+            try:
+                os.remove(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def lookup(self, url: str, version: str) -> Optional[str]:
+        """Return the path of a verified cached blob, or None on a miss"""
+        key = self._key(url, version)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            path = self._blob_path(entry["sha256"])
+            try:
+                digest = sha256_file(path)
+            except FileNotFoundError:
+                digest = None
+            if digest != entry["sha256"]:
+                logger.warning(f"cache: {url} failed verification, evicting")
+                self._drop(key)
+                self._save_index()
+                return None
+            entry["last_used"] = time.time()
+            self._save_index()
+        logger.debug(f"cache: hit {url} ({version})")
+        return path
+
+    def store(self, url: str, version: str, path: str, move: bool = False) -> str:
+        """Add the file at path to the cache and return the cached blob path"""
+        digest = sha256_file(path)
+        blob_path = self._blob_path(digest)
+        with self._lock:
+            os.makedirs(self._blob_dir, exist_ok=True)
+            if not os.path.exists(blob_path):
+                tmp_path = blob_path + ".tmp"
+                if move:
+                    shutil.move(path, tmp_path)
+                else:
+                    shutil.copy2(path, tmp_path)
+                os.replace(tmp_path, blob_path)
+            elif move:
+                os.remove(path)
+            self._index[self._key(url, version)] = {
+                "url": url,
+                "version": version,
+                "sha256": digest,
+                "size": os.path.getsize(blob_path),
+                "last_used": time.time(),
+            }
+            self._evict()
+            self._save_index()
+        logger.debug(f"cache: stored {url} ({version}) as {digest}")
+        return blob_path
+
+    def _evict(self) -> None:
+        sizes: Dict[str, int] = {}
+        for entry in self._index.values():
+            sizes[entry["sha256"]] = entry["size"]
+        total = sum(sizes.values())
+        for key, entry in sorted(self._index.items(), key=lambda i: i[1]["last_used"]):
+            if total <= self.max_size or len(self._index) <= 1:
+                break
+            digest = entry["sha256"]
+            self._drop(key)
+            if digest in sizes and not os.path.exists(self._blob_path(digest)):
+                total -= sizes.pop(digest)
+                logger.debug(f"cache: evicted {entry['url']} ({entry['version']})")
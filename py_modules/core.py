@@ -1,39 +1,164 @@
 import asyncio
+from enum import Enum
 import os
-from typing import Awaitable, Callable, Optional, List
+import random
+import signal
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, List
 
 import decky
 from decky import logger
+from instrument import instrumented, span
+from corelog import CoreLogCapture
+from precheck import PrecheckRunner
+from resource_policy import ResourcePolicy
 import utils
-from setting import Settings
+from metadata import DEFAILT_PORT
+from setting import get_settings
 
 ExitCallback = Callable[[Optional[int]], Awaitable[None]]
+StateCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class CoreState(Enum):
+    STOPPED = "stopped"
+    STARTING = "starting"
+    PRECHECKING = "prechecking"
+    RUNNING = "running"
+    DEGRADED = "degraded"
+    STOPPING = "stopping"
+    EXITED = "exited"
+    RESTARTING = "restarting"
 
 
 class CoreController:
     CORE_PATH = os.path.join(decky.DECKY_PLUGIN_DIR, "bin", "natpierce")
+    SLOTS_DIR = os.path.join(decky.DECKY_PLUGIN_DIR, "bin", "slots")
     CONFIG_PATH = os.path.join(decky.DECKY_PLUGIN_DIR, "bin", "data", "config")
     DECKY_CONFIG_PATH = os.path.join(
         decky.DECKY_PLUGIN_SETTINGS_DIR, "natpierce_config"
     )
     RESOURCE_DIR = decky.DECKY_PLUGIN_RUNTIME_DIR
+    STATE_COALESCE_DELAY = 0.05
+    RESTART_BACKOFF_BASE = 1.0
+    RESTART_BACKOFF_MAX = 60.0
+    RESTART_BUDGET = 5
+    RESTART_WINDOW = 300.0
+    # a run longer than this resets the backoff
+    STABLE_UPTIME = 60.0
+    DEFAULT_STOP_TIMEOUT = 5.0
+    PORT_RELEASE_TIMEOUT = 5.0
+    DEFAULT_READY_TIMEOUT = 15.0
+    READY_PROBE_INTERVAL = 0.1
 
     def __init__(self):
-        self.settings = Settings()
+        self.settings = get_settings()
+        self.settings.subscribe("controller_port", self._on_port_changed)
+        self.settings.subscribe("costom_port", self._on_port_changed)
 
         self._process: Optional[asyncio.subprocess.Process] = None
         self._command: List[str] = []
+        self._active_port: Optional[int] = None
+        self._port_restart_task: Optional[asyncio.Task] = None
         self._exit_callback: Optional[ExitCallback] = None
         self._monitor_task: Optional[asyncio.Task] = None
+        self._state = CoreState.STOPPED
+        self._state_since = time.time()
+        self._exit_code: Optional[int] = None
+        self._last_error: Optional[str] = None
+        self._state_callback: Optional[StateCallback] = None
+        self._state_emit_task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        self._supervisor_task: Optional[asyncio.Task] = None
+        self._restart_times: List[float] = []
+        self._restart_attempt = 0
+        self._restart_count = 0
+        self._last_exit_code: Optional[int] = None
+        self._crash_loop = False
+        # set once the current process served its port, only such a core is
+        # restarted by the supervisor, a start that fails is reported instead
+        self._ready = False
+        # serializes start, stop and restart, the public methods take it and
+        # only call the *_locked helpers while holding it
+        self._lifecycle_lock = asyncio.Lock()
+        self._game_running = False
+        self._policy: Optional[ResourcePolicy] = None
+        self._precheck = PrecheckRunner()
         self.log_path = os.path.join(decky.DECKY_PLUGIN_LOG_DIR, "core.log")
+        self._log = CoreLogCapture(
+            self.log_path,
+            max_bytes=int(self._get_setting("core_log_max_bytes", 1024 * 1024)),
+            backups=int(self._get_setting("core_log_backups", 3)),
+            compress=bool(self._get_setting("core_log_compress", True)),
+        )
+
+    def _get_setting(self, key: str, default: Any) -> Any:
+        value = self.settings.getSetting(key)
+        return default if value is None else value
+
+    def _on_port_changed(self, key: str, value: Any) -> None:
+        if not self.is_running:
+            return
+        if self._port_restart_task is not None and not self._port_restart_task.done():
+            return
+        # controller_port and costom_port are often saved together, the task
+        # runs once both are stored and restarts at most once for them
+        self._port_restart_task = asyncio.create_task(self._restart_for_port())
+
+    async def _restart_for_port(self) -> None:
+        await asyncio.sleep(0)
+        self._port_restart_task = None
+        if not self.is_running or not self._port_outdated():
+            return
+        logger.info(f"controller port changed from {self._active_port}, restarting core")
+        await self._restart_logged()
+
+    def _port_outdated(self) -> bool:
+        """Whether the port settings no longer allow the port in use"""
+        port = self._active_port
+        if self._get_setting("costom_port", False):
+            return port != self._get_controller_port()
+        start = int(self._get_setting("port_range_start", DEFAILT_PORT))
+        end = int(self._get_setting("port_range_end", start))
+        return port is None or not start <= port <= end
+
+    async def _restart_logged(self) -> None:
+        try:
+            await self.restart()
+        except Exception as e:
+            logger.error(f"failed to restart core: {e}")
 
     def _get_controller_port(self) -> int:
         port = self.settings.getSetting("controller_port")
         if port is None:
-            port = 33272
-        logger.debug(f"get_controller_port: {port}")
+            port = DEFAILT_PORT
+        logger.debug("get_controller_port: %s", port)
         return int(port)
 
+    async def _select_port(self) -> int:
+        """The configured port when costom_port is on, otherwise the first free
+        port of the configured range, preferring the one used last time"""
+        if self._get_setting("costom_port", False):
+            port = self._get_controller_port()
+            if not await utils.wait_port_free(port, self.PORT_RELEASE_TIMEOUT):
+                raise RuntimeError(f"controller port {port} is already in use")
+            return port
+        start = int(self._get_setting("port_range_start", DEFAILT_PORT))
+        end = int(self._get_setting("port_range_end", start))
+        port = utils.find_free_port(start, end, self._active_port or start)
+        if port is None:
+            raise RuntimeError(f"no free controller port in {start}-{end}")
+        return port
+
+    @property
+    def port(self) -> Optional[int]:
+        """Port the core's web controller is listening on, None when stopped"""
+        return self._active_port if self.is_running else None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self.is_running and self._process else None
+
     @property
     def is_running(self) -> bool:
         if not self._process:
@@ -42,6 +167,86 @@ class CoreController:
             return True
         return False
 
+    def _get_stop_timeout(self) -> float:
+        value = self.settings.getSetting("stop_timeout")
+        if value is None:
+            return self.DEFAULT_STOP_TIMEOUT
+        return float(value)
+
+    @property
+    def supervised(self) -> bool:
+        value = self.settings.getSetting("supervise")
+        return True if value is None else bool(value)
+
+    @property
+    def uptime(self) -> float:
+        if not self.is_running or self._started_at is None:
+            return 0.0
+        return time.time() - self._started_at
+
+    @property
+    def restart_count(self) -> int:
+        return self._restart_count
+
+    @property
+    def last_exit_code(self) -> Optional[int]:
+        return self._last_exit_code
+
+    @property
+    def state_since(self) -> float:
+        return self._state_since
+
+    @property
+    def state(self) -> CoreState:
+        return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All status fields of the core in one dict"""
+        return {
+            "state": self._state.value,
+            "since": self._state_since,
+            "running": self.is_running,
+            "pid": self.pid,
+            "exit_code": self._exit_code,
+            "last_error": self._last_error,
+            "command": self._command,
+            "uptime": self.uptime,
+            "restart_count": self._restart_count,
+            "last_exit_code": self._last_exit_code,
+            "crash_loop": self._crash_loop,
+            "port": self.port,
+        }
+
+    def set_state_callback(self, callback: Optional[StateCallback]):
+        self._state_callback = callback
+
+    def _set_state(self, state: CoreState) -> None:
+        if state == self._state:
+            return
+        logger.debug("core state: %s -> %s", self._state.value, state.value)
+        self._state = state
+        self._state_since = time.time()
+        if self._state_callback is None:
+            return
+        # coalesce bursts of transitions into a single event with the latest state
+        if self._state_emit_task is None or self._state_emit_task.done():
+            self._state_emit_task = asyncio.create_task(self._emit_state())
+
+    async def _emit_state(self) -> None:
+        await asyncio.sleep(self.STATE_COALESCE_DELAY)
+        sent = None
+        # transitions during a send do not start another task, so send again
+        # until the state the frontend last saw is the current one
+        while self._state_callback is not None:
+            stamp = (self._state, self._state_since)
+            if stamp == sent:
+                return
+            sent = stamp
+            try:
+                await self._state_callback(self.snapshot())
+            except Exception as e:
+                logger.error(f"error in state callback: {str(e)}")
+
     @classmethod
     def _gen_cmd(cls, port: int) -> List[str]:
         return [
@@ -55,67 +260,218 @@ class CoreController:
             CONFIG_DIR = os.path.dirname(self.CONFIG_PATH)
             if not os.path.exists(CONFIG_DIR):
                 os.makedirs(CONFIG_DIR, exist_ok=True)
-            if os.path.exists(self.CONFIG_PATH):
+            if os.path.lexists(self.CONFIG_PATH):
                 os.remove(self.CONFIG_PATH)
             os.symlink(self.DECKY_CONFIG_PATH, self.CONFIG_PATH)
         except Exception as e:
             logger.error(f"failed to link config: {e}", exc_info=True)
             raise
 
+    @instrumented("core.start")
     async def start(self) -> None:
+        self._take_over_supervisor()
+        async with self._lifecycle_lock:
+            await self._start_locked()
+
+    def _take_over_supervisor(self) -> None:
+        if asyncio.current_task() is not self._supervisor_task:
+            # a manual start takes over from any pending supervised restart
+            self._cancel_supervisor()
+            self._crash_loop = False
+            self._restart_attempt = 0
+
+    async def _start_locked(self) -> None:
+        self._set_state(CoreState.STARTING)
+        self._last_error = None
+        try:
+            await self._start()
+        except BaseException as e:
+            # a supervised start cancelled by stop() must not stay in a
+            # transitional state either
+            if isinstance(e, Exception):
+                self._last_error = str(e)
+            if not self.is_running:
+                self._set_state(CoreState.STOPPED)
+            raise
+        self._ready = True
+        self._set_state(CoreState.RUNNING)
+
+    async def _start(self) -> None:
         # System environment check before starting
-        await self._pre_start_check()
-        
-        await self._link_config()
+        self._set_state(CoreState.PRECHECKING)
+        with span("core.precheck"):
+            await self._pre_start_check()
+
+        with span("core.link_config"):
+            await self._link_config()
         if self._process and self._process.returncode is None:
             logger.warning("core is already running")
-            await self.stop()
+            await self._stop_locked()
 
-        command = self._gen_cmd(self._get_controller_port())
+        with span("core.select_port"):
+            port = await self._select_port()
+        policy = self._build_policy()
+        policy.prepare()
+        self._policy = policy
+        command = self._gen_cmd(port)
         logger.info(f"starting core: {' '.join(command)}")
         self._command = command
 
         logger.debug(f"core log file: {self.log_path}")
-        self._logfile = open(self.log_path, "w")
 
+        self._ready = False
         try:
-            self._process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=self._logfile,
-                stderr=self._logfile,
-                env=utils.env_fix(),
-            )
-            logger.debug(f"core pid: {self._process.pid}")
-            self._monitor_task = asyncio.create_task(self._monitor_exit())
+            with span("core.spawn"):
+                self._process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    env=utils.env_fix(),
+                    # own process group, so stop() also reaches any children that
+                    # would otherwise keep the output pipe open
+                    start_new_session=True,
+                    preexec_fn=policy.preexec if policy.needs_preexec else None,
+                )
+                logger.debug(f"core pid: {self._process.pid}")
+                self._started_at = time.time()
+                self._exit_code = None
+                self._monitor_task = asyncio.create_task(self._monitor_exit())
+                self._active_port = port
+                assert self._process.stdout is not None
+                await self._log.start(self._process.stdout)
         except Exception as e:
             logger.error(f"failed to start core: {str(e)}")
-            self._logfile.close()
-            self._logfile = None
             raise
 
+        try:
+            with span("core.wait_ready"):
+                await self._wait_ready(port)
+        except Exception as e:
+            logger.error(f"core did not become ready: {e}")
+            if self.is_running:
+                await self._stop_locked()
+            raise
+
+    async def _wait_ready(self, port: int) -> None:
+        """Wait until the web controller accepts connections"""
+        timeout = float(self._get_setting("ready_timeout", self.DEFAULT_READY_TIMEOUT))
+        started = time.monotonic()
+        deadline = started + timeout
+        while not await utils.probe_port(port):
+            returncode = await self.wait_exit(self.READY_PROBE_INTERVAL)
+            if returncode is not None:
+                raise RuntimeError(f"core exited with code {returncode} before serving")
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"port {port} not accepting connections after {timeout:.0f}s")
+        logger.info(f"core ready on port {port} in {time.monotonic() - started:.2f}s")
+
+    @instrumented("core.stop")
     async def stop(self) -> None:
+        # cancel before waiting, a supervised restart may hold the lock
+        self._cancel_supervisor()
+        async with self._lifecycle_lock:
+            await self._stop_locked()
+
+    async def _stop_locked(self) -> None:
+        self._cancel_supervisor()
         if not self._process or self._process.returncode is not None:
             raise RuntimeError("No running core")
 
-        logger.info(f"terminating core (PID: {self._process.pid})")
+        process = self._process
+        logger.info(f"terminating core (PID: {process.pid})")
+        self._set_state(CoreState.STOPPING)
         if self._monitor_task is not None:
             self._monitor_task.cancel()
             self._monitor_task = None
         try:
-            self._process.terminate()
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                returncode = await asyncio.wait_for(
+                    process.wait(), self._get_stop_timeout()
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"core (PID: {process.pid}) ignored SIGTERM, killing")
+                os.killpg(process.pid, signal.SIGKILL)
+                returncode = await process.wait()
+            logger.debug(f"core reaped with code: {returncode}")
+            self._last_exit_code = returncode
+        except ProcessLookupError:
+            pass
         except Exception as e:
             logger.error(f"failed to terminate core with error: {e}")
         finally:
             self._process = None
+            self._exit_code = None
+            self._set_state(CoreState.STOPPED)
             logger.debug("core terminated")
-            if self._logfile:
-                self._logfile.close()
-                self._logfile = None
+            await self._log.stop()
+
+        port = self._active_port
+        if port is not None and not await utils.wait_port_free(
+            port, self.PORT_RELEASE_TIMEOUT
+        ):
+            logger.warning(f"controller port {port} is still in use after stop")
+
+    def _build_policy(self) -> ResourcePolicy:
+        game_mode = self._game_running and bool(self._get_setting("game_mode", True))
+        return ResourcePolicy.from_settings(self.settings, game_mode)
+
+    @property
+    def policy(self) -> Optional[Dict[str, Any]]:
+        return self._policy.to_dict() if self._policy is not None else None
+
+    def set_game_running(self, running: bool) -> None:
+        """Switch the running core between the normal and the game mode policy"""
+        if running == self._game_running:
+            return
+        self._game_running = running
+        if not self.is_running or self._process is None:
+            return
+        policy = self._build_policy()
+        logger.info(f"game {'started' if running else 'stopped'}, core policy: {policy.to_dict()}")
+        policy.apply_to(self._process.pid)
+        self._policy = policy
+
+    def set_degraded(self, degraded: bool) -> None:
+        """Switch between RUNNING and DEGRADED, as judged by the health monitor"""
+        if degraded and self._state == CoreState.RUNNING:
+            self._set_state(CoreState.DEGRADED)
+        elif not degraded and self._state == CoreState.DEGRADED:
+            self._set_state(CoreState.RUNNING)
+
+    @instrumented("core.restart")
+    async def restart(self) -> None:
+        self._take_over_supervisor()
+        async with self._lifecycle_lock:
+            self._set_state(CoreState.RESTARTING)
+            if self.is_running:
+                await self._stop_locked()
+            await self._start_locked()
+
+    async def wait_exit(self, timeout: float) -> Optional[int]:
+        """Wait up to timeout seconds for the core to exit, return its exit code
+        or None if it is still running"""
+        process = self._process
+        if process is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(process.wait()), timeout)
+        except asyncio.TimeoutError:
+            return None
 
     async def _monitor_exit(self):
         assert self._process is not None
         returncode = await self._process.wait()
         logger.debug(f"core exited with code: {returncode}")
+        self._exit_code = returncode
+        self._last_exit_code = returncode
+        self._set_state(CoreState.EXITED)
+        await self._log.stop()
+
+        if self.supervised and self._ready:
+            if self._run_time() >= self.STABLE_UPTIME:
+                self._restart_attempt = 0
+            self._schedule_restart()
 
         if self._exit_callback is not None:
             try:
@@ -123,142 +479,87 @@ class CoreController:
             except Exception as e:
                 logger.error(f"error in exit callback: {str(e)}")
 
-    def set_exit_callback(self, callback: Optional[ExitCallback]):
-        self._exit_callback = callback
+    def _run_time(self) -> float:
+        if self._started_at is None:
+            return 0.0
+        return time.time() - self._started_at
 
-    async def _check_tun_module(self) -> None:
-        """Check and handle TUN module"""
-        try:
-            # Check if TUN module exists (modinfo tun)
-            proc = await asyncio.create_subprocess_exec(
-                'modinfo', 'tun',
-                stdout=asyncio.subprocess.DEVNULL,
-                stderr=asyncio.subprocess.DEVNULL,
-                env=utils.env_fix()
-            )
-            returncode = await proc.wait()
-            
-            if returncode != 0:
-                logger.error("TUN module does not exist in the system")
-                raise RuntimeError("TUN module not found, please ensure kernel supports TUN/TAP")
-            
-            logger.info("TUN module exists in the system")
-            
-            # Check if TUN module is loaded (lsmod | grep -q "^tun ")
-            proc = await asyncio.create_subprocess_shell(
-                'lsmod | grep -q "^tun "',
-                stdout=asyncio.subprocess.DEVNULL,
-                stderr=asyncio.subprocess.DEVNULL,
-                env=utils.env_fix()
-            )
-            returncode = await proc.wait()
-            
-            if returncode == 0:
-                logger.info("TUN module is already loaded")
-                return
-            
-            # TUN module not loaded, try to load it (modprobe tun)
-            logger.info("TUN module not loaded, attempting to load...")
-            proc = await asyncio.create_subprocess_exec(
-                'modprobe', 'tun',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=utils.env_fix()
+    def _cancel_supervisor(self) -> None:
+        task = self._supervisor_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        self._supervisor_task = None
+
+    def _schedule_restart(self) -> None:
+        now = time.time()
+        self._restart_times = [
+            t for t in self._restart_times if now - t < self.RESTART_WINDOW
+        ]
+        if len(self._restart_times) >= self.RESTART_BUDGET:
+            logger.error(
+                f"core crashed {len(self._restart_times)} times in "
+                f"{self.RESTART_WINDOW:.0f}s, giving up on automatic restarts"
             )
-            stdout, stderr = await proc.communicate()
-            
-            if proc.returncode == 0:
-                logger.info("TUN module loaded successfully")
-            else:
-                error_msg = stderr.decode().strip() if stderr else "unknown error"
-                logger.error(f"Failed to load TUN module: {error_msg}")
-                raise RuntimeError(f"Cannot load TUN module, may need root privileges: {error_msg}")
-                
-        except Exception as e:
-            logger.error(f"TUN module check failed: {e}")
-            raise
+            self._crash_loop = True
+            return
+        # capped exponential backoff with full jitter in its upper half
+        delay = min(
+            self.RESTART_BACKOFF_MAX,
+            self.RESTART_BACKOFF_BASE * 2**self._restart_attempt,
+        )
+        delay *= random.uniform(0.5, 1.0)
+        self._restart_attempt += 1
+        self._restart_times.append(now)
+        logger.info(f"restarting core in {delay:.1f}s (attempt {self._restart_attempt})")
+        self._supervisor_task = asyncio.create_task(self._supervised_restart(delay))
 
-    async def _check_ip_forward(self) -> None:
-        """Check and enable IP forwarding"""
+    async def _supervised_restart(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._set_state(CoreState.RESTARTING)
         try:
-            # Read current IP forwarding status
-            with open('/proc/sys/net/ipv4/ip_forward', 'r') as f:
-                current_value = f.read().strip()
-            
-            if current_value == '1':
-                logger.info("IP forwarding is already enabled")
-                return
-            
-            # IP forwarding not enabled, try to enable it
-            logger.info("IP forwarding not enabled, attempting to enable...")
-            with open('/proc/sys/net/ipv4/ip_forward', 'w') as f:
-                f.write('1')
-            
-            # Verify if successfully enabled
-            with open('/proc/sys/net/ipv4/ip_forward', 'r') as f:
-                new_value = f.read().strip()
-            
-            if new_value == '1':
-                logger.info("IP forwarding enabled successfully")
-            else:
-                raise RuntimeError("Failed to enable IP forwarding, status verification failed")
-                
-        except PermissionError:
-            logger.error("Root privileges required to enable IP forwarding")
-            raise RuntimeError("Root privileges required to enable IP forwarding")
-        except FileNotFoundError:
-            logger.error("IP forwarding configuration file not found")
-            raise RuntimeError("System does not support IP forwarding")
+            await self.start()
+            self._restart_count += 1
         except Exception as e:
-            logger.error(f"IP forwarding check failed: {e}")
-            raise RuntimeError(f"Cannot enable IP forwarding: {e}")
+            logger.error(f"supervised restart failed: {e}")
+            # a core that exits before it is ready is not rescheduled by
+            # _monitor_exit, the retry and its budget are handled here
+            if self._supervisor_task in (None, asyncio.current_task()):
+                self._schedule_restart()
+        finally:
+            if self._supervisor_task is asyncio.current_task():
+                self._supervisor_task = None
+
+    def set_exit_callback(self, callback: Optional[ExitCallback]):
+        self._exit_callback = callback
+
+    @property
+    def precheck_report(self) -> Dict[str, Any]:
+        return self._precheck.report
+
+    async def run_precheck(self) -> Dict[str, Any]:
+        return await self._precheck.run()
 
     async def _pre_start_check(self) -> None:
         """System environment check before starting"""
-        logger.info("Starting system environment check...")
-        
-        try:
-            # Execute checks in order
-            await self._check_tun_module()
-            await self._check_ip_forward()
-            logger.info("System environment check completed, all checks passed")
-            
-        except Exception as e:
-            logger.error(f"System environment check failed: {e}")
-            raise RuntimeError(f"System environment does not meet requirements: {e}")
+        report = await self._precheck.run()
+        if not report["ok"]:
+            errors = "; ".join(p["message"] for p in report["probes"] if not p["ok"])
+            logger.error(f"System environment check failed: {errors}")
+            raise RuntimeError(f"System environment does not meet requirements: {errors}")
+        logger.debug(f"System environment check passed in {report['duration']:.3f}s")
 
     async def get_version(self) -> str:
         """Get natpierce core version"""
-        if self.is_running:
-            return self._parse_version_from_log()
+        if self.is_running and self._log.banner.version:
+            return self._log.banner.version
         elif os.path.exists(self.CORE_PATH):
             return self.settings.getSetting("core_version")
         else:
             return ""
 
-    def _parse_version_from_log(self) -> str:
-        """Parse version from log file (match lines starting with spaces)"""
-        try:
-            if not os.path.exists(self.log_path):
-                return ""
-            
-            with open(self.log_path, 'r') as f:
-                lines = f.readlines()
-            
-            # Search from bottom to top for latest version info
-            for line in reversed(lines):
-                # Match version pattern in lines starting with spaces
-                import re
-                if re.match(r'^\s+', line):  # Line starts with spaces
-                    match = re.search(r'V\d+\.\d+', line)
-                    if match:
-                        version = match.group().replace("V", "v")
-                        logger.debug(f"Found version: {version}")
-                        return version
-            
-            logger.warning("Version not found in log")
-            return ""
-            
-        except Exception as e:
-            logger.error(f"Failed to parse version from log: {e}")
-            return ""
\ No newline at end of file
+    @property
+    def banner(self) -> Dict[str, Any]:
+        return self._log.banner.to_dict()
+
+    def get_log_lines(self, before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        return self._log.page(before, limit)
@@ -0,0 +1,220 @@
+import asyncio
+from collections import deque
+import gzip
+import os
+import re
+import shutil
+from typing import Any, BinaryIO, Deque, Dict, Optional, Tuple
+
+from decky import logger
+
+_VERSION_RE = re.compile(r"^\s+.*?V(\d+\.\d+)")
+_URL_RE = re.compile(r"https?://\S+")
+
+
+class CoreBanner:
+    """Facts the core prints at startup, parsed one line at a time"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.version = ""
+        self.web_url = ""
+        self.lines = 0
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.version)
+
+    def feed_line(self, line: str) -> None:
+        self.lines += 1
+        if not self.version:
+            # version is printed on an indented banner line, e.g. "   ... V1.08"
+            match = _VERSION_RE.match(line)
+            if match:
+                self.version = "v" + match.group(1)
+                logger.debug(f"Found version: {self.version}")
+        if not self.web_url:
+            match = _URL_RE.search(line)
+            if match:
+                self.web_url = match.group()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": self.version, "web_url": self.web_url, "lines": self.lines}
+
+
+class RotatingLog:
+    """Size-capped log file that keeps `backups` rotated copies, optionally
+    gzip compressed, e.g. core.log, core.log.1.gz, core.log.2.gz"""
+
+    def __init__(
+        self, path: str, max_bytes: int, backups: int, compress: bool = False
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self._file: Optional[BinaryIO] = None
+        self._size = 0
+
+    def _backup_path(self, index: int) -> str:
+        return f"{self.path}.{index}"
+
+    def open(self) -> None:
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def rotate(self) -> None:
+        self.close()
+        for index in range(self.backups, 0, -1):
+            for ext in ("", ".gz"):
+                src = self._backup_path(index) + ext
+                if not os.path.exists(src):
+                    continue
+                if index == self.backups:
+                    os.remove(src)
+                else:
+                    os.replace(src, self._backup_path(index + 1) + ext)
+        if self.backups > 0 and os.path.exists(self.path):
+            dest = self._backup_path(1)
+            os.replace(self.path, dest)
+            if self.compress:
+                with open(dest, "rb") as src, gzip.open(dest + ".gz", "wb") as out:
+                    shutil.copyfileobj(src, out)
+                os.remove(dest)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, data: bytes) -> None:
+        if self._file is None:
+            self.open()
+        assert self._file is not None
+        self._file.write(data)
+        self._size += len(data)
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.max_bytes
+
+
+class CoreLogCapture:
+    """Captures the core's output from a pipe into a RotatingLog.
+
+    Each run starts a fresh log file and rotates the previous run out, the
+    last `ring_size` lines are also kept in memory with increasing sequence
+    numbers so they can be paged without touching the file.
+    """
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 1024 * 1024,
+        backups: int = 3,
+        compress: bool = False,
+        ring_size: int = 1000,
+        banner: Optional[CoreBanner] = None,
+    ):
+        self.log = RotatingLog(path, max_bytes, backups, compress)
+        self.banner = banner if banner is not None else CoreBanner()
+        self._ring: Deque[Tuple[int, str]] = deque(maxlen=ring_size)
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        # set once writing the file failed, e.g. ENOSPC, output then only
+        # goes to the ring so the pipe keeps draining and the core never blocks
+        self._file_error: Optional[OSError] = None
+
+    async def start(self, stream: asyncio.StreamReader) -> None:
+        await self.stop()
+        self.banner.reset()
+        self._ring.clear()
+        self._file_error = None
+        try:
+            await asyncio.to_thread(self.log.rotate)
+            self.log.open()
+        except OSError as e:
+            self._disable_file(e)
+        self._task = asyncio.create_task(self._capture(stream))
+
+    async def stop(self, timeout: float = 1.0) -> None:
+        """Wait for the remaining output to be captured, then close the log"""
+        task = self._task
+        self._task = None
+        if task is not None:
+            try:
+                await asyncio.wait_for(task, timeout)
+            except asyncio.TimeoutError:
+                logger.warning("core log capture did not finish, cancelling")
+            except Exception as e:
+                logger.error(f"core log capture failed: {e}")
+        try:
+            self.log.close()
+        except OSError as e:
+            logger.error(f"failed to close core log: {e}")
+
+    def _add_line(self, line: bytes) -> None:
+        text = line.decode(errors="replace").rstrip("\r")
+        self._seq += 1
+        self._ring.append((self._seq, text))
+        if not self.banner.complete:
+            self.banner.feed_line(text)
+
+    def _disable_file(self, error: OSError) -> None:
+        self._file_error = error
+        logger.error(f"core log file disabled, keeping output in memory only: {error}")
+        try:
+            self.log.close()
+        except OSError:
+            pass
+
+    async def _write_file(self, data: bytes) -> None:
+        try:
+            self.log.write(data)
+            self.log.flush()
+            if self.log.full:
+                await asyncio.to_thread(self.log.rotate)
+                self.log.open()
+        except OSError as e:
+            self._disable_file(e)
+
+    async def _capture(self, stream: asyncio.StreamReader) -> None:
+        # the only reader of the core's pipe, it must keep reading until EOF
+        partial = b""
+        while True:
+            data = await stream.read(self.READ_SIZE)
+            if not data:
+                break
+            if self._file_error is None:
+                await self._write_file(data)
+            lines = (partial + data).split(b"\n")
+            partial = lines.pop()
+            for line in lines:
+                self._add_line(line)
+        if partial:
+            self._add_line(partial)
+
+    def page(self, before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        """Return up to limit lines older than the `before` sequence number,
+        or the newest lines when before is None"""
+        lines = [
+            {"seq": seq, "text": text}
+            for seq, text in self._ring
+            if before is None or seq < before
+        ]
+        lines = lines[-limit:] if limit > 0 else []
+        return {
+            "lines": lines,
+            "first_seq": self._ring[0][0] if self._ring else 0,
+            "last_seq": self._seq,
+        }
@@ -0,0 +1,368 @@
+import asyncio
+import io
+import json
+import os
+import queue
+import shutil
+import tarfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+import decky
+from decky import logger
+import http_client
+import utils
+
+DOWNLOAD_DIR = os.path.join(decky.DECKY_PLUGIN_RUNTIME_DIR, "downloads")
+CHUNK_SIZE = 128 * 1024
+MIN_SEGMENT_SIZE = 1024 * 1024
+STATE_SAVE_INTERVAL = 4 * 1024 * 1024
+
+# [start, end, downloaded], end is inclusive
+Segment = List[int]
+
+
+class _DownloadState:
+    def __init__(self, path: str, url: str, size: int, etag: Optional[str]):
+        self.path = path
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.segments: List[Segment] = []
+
+    @property
+    def downloaded(self) -> int:
+        return sum(seg[2] for seg in self.segments)
+
+    @property
+    def completed(self) -> bool:
+        return all(seg[0] + seg[2] > seg[1] for seg in self.segments)
+
+    def split(self, count: int) -> None:
+        count = max(1, min(count, self.size // MIN_SEGMENT_SIZE))
+        step = self.size // count
+        self.segments = []
+        for i in range(count):
+            start = i * step
+            end = self.size - 1 if i == count - 1 else start + step - 1
+            self.segments.append([start, end, 0])
+
+    @classmethod
+    def load(cls, path: str) -> Optional["_DownloadState"]:
+        try:
+            with open(path, "r") as f:
+                data: Dict[str, Any] = json.load(f)
+            state = cls(path, data["url"], int(data["size"]), data.get("etag"))
+            state.segments = [[int(x) for x in seg] for seg in data["segments"]]
+            return state
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"download state {path} is invalid: {e}")
+            return None
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "url": self.url,
+                    "size": self.size,
+                    "etag": self.etag,
+                    "segments": self.segments,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        for path in (self.path, self.path + ".tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+async def _probe(
+    session: aiohttp.ClientSession, url: str
+) -> Tuple[str, int, Optional[str], bool]:
+    """Return the resolved url, size, etag and whether ranges are supported"""
+    async with session.get(url, headers={"Range": "bytes=0-0"}) as response:
+        response.raise_for_status()
+        etag = response.headers.get("ETag")
+        resolved = str(response.url)
+        if response.status == 206:
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rpartition("/")[2]
+            if total.isdigit():
+                return resolved, int(total), etag, True
+        return resolved, int(response.headers.get("Content-Length", 0)), etag, False
+
+
+class _Progress:
+    def __init__(self, total: int, downloaded: int, callback: utils.ProgressCallback):
+        self.total = total
+        self.downloaded = downloaded
+        self.callback = callback
+        self.last_percent = 0
+
+    async def add(self, size: int) -> None:
+        self.downloaded += size
+        if self.total <= 0:
+            return
+        percent = int(self.downloaded / self.total * 100)
+        if percent > self.last_percent:
+            self.last_percent = percent
+            logger.debug(f"downloading: {percent}%")
+            await self.callback(percent)
+
+
+async def _fetch_segment(
+    session: aiohttp.ClientSession,
+    url: str,
+    fd: int,
+    segment: Segment,
+    state: _DownloadState,
+    progress: _Progress,
+    retries: int,
+) -> None:
+    attempt = 0
+    unsaved = 0
+    while segment[0] + segment[2] <= segment[1]:
+        offset = segment[0] + segment[2]
+        headers = {"Range": f"bytes={offset}-{segment[1]}"}
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status != 206:
+                    raise RuntimeError(
+                        f"unexpected status {response.status} for range {offset}-{segment[1]}"
+                    )
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    chunk = chunk[: segment[1] - segment[0] - segment[2] + 1]
+                    os.pwrite(fd, chunk, segment[0] + segment[2])
+                    segment[2] += len(chunk)
+                    unsaved += len(chunk)
+                    if unsaved >= STATE_SAVE_INTERVAL:
+                        unsaved = 0
+                        state.save()
+                    await progress.add(len(chunk))
+                    attempt = 0
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = min(2**attempt, 30)
+            logger.warning(
+                f"segment {segment[0]}-{segment[1]} failed with {e}, retrying in {delay}s"
+            )
+            await asyncio.sleep(delay)
+
+
+async def _fetch_stream(
+    session: aiohttp.ClientSession, url: str, fd: int, progress: _Progress
+) -> int:
+    size = 0
+    async with session.get(url) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            os.pwrite(fd, chunk, size)
+            size += len(chunk)
+            await progress.add(len(chunk))
+    return size
+
+
+async def download_with_progress(
+    url: str,
+    name: str,
+    progress_callback: utils.ProgressCallback,
+    segments: int = 4,
+    retries: int = 3,
+    dest_dir: str = DOWNLOAD_DIR,
+) -> str:
+    """Download url into dest_dir using parallel range requests.
+
+    Partial downloads are kept in `<name>.part` together with a `<name>.state`
+    file, so an interrupted download resumes from where it stopped.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    name = utils.sanitize_filename(name)
+    dest = os.path.join(dest_dir, name)
+    part_path = dest + ".part"
+    state_path = dest + ".state"
+
+    await progress_callback(0)
+    session = http_client.get_session()
+    resolved, size, etag, ranged = await _probe(session, url)
+    logger.debug(f"downloading: {url} ({size} bytes, ranged={ranged}) to {dest}")
+
+    state = _DownloadState.load(state_path)
+    if (
+        state is None
+        or not ranged
+        or state.url != url
+        or state.size != size
+        or state.etag != etag
+        or not os.path.exists(part_path)
+    ):
+        if state is not None:
+            logger.debug(f"discarding stale partial download {part_path}")
+            state.remove()
+        state = _DownloadState(state_path, url, size, etag)
+        state.split(segments if ranged else 1)
+        with open(part_path, "wb") as f:
+            if ranged:
+                f.truncate(size)
+    else:
+        logger.info(f"resuming download at {state.downloaded}/{size} bytes")
+
+    progress = _Progress(size, state.downloaded, progress_callback)
+    fd = os.open(part_path, os.O_WRONLY)
+    try:
+        if ranged:
+            tasks = [
+                asyncio.create_task(
+                    _fetch_segment(
+                        session, resolved, fd, seg, state, progress, retries
+                    )
+                )
+                for seg in state.segments
+                if seg[0] + seg[2] <= seg[1]
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                # make sure no segment keeps writing to a closed fd
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        else:
+            await _fetch_stream(session, resolved, fd, progress)
+    finally:
+        os.close(fd)
+        if ranged:
+            state.save()
+
+    if ranged and not state.completed:
+        raise RuntimeError(f"download of {url} is incomplete")
+    os.replace(part_path, dest)
+    state.remove()
+    await progress_callback(-1)
+    return dest
+
+
+class _QueueReader(io.RawIOBase):
+    """File-like object fed with chunks from another thread, None marks EOF"""
+
+    def __init__(self, chunks: "queue.Queue[Optional[bytes]]"):
+        self._chunks = chunks
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        while not self._buffer and not self._eof:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer = chunk
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _extract_member(
+    chunks: "queue.Queue[Optional[bytes]]", member_name: str, dest: str
+) -> None:
+    reader = io.BufferedReader(_QueueReader(chunks), CHUNK_SIZE)
+    with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+        for member in tar:
+            if not member.isfile() or os.path.basename(member.name) != member_name:
+                continue
+            src = tar.extractfile(member)
+            assert src is not None
+            with open(dest, "wb") as out:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+            logger.debug(f"extracted {member.name} ({member.size} bytes) to {dest}")
+            return
+    raise FileNotFoundError(f"{member_name} not found in archive")
+
+
+async def stream_extract_member(
+    url: str,
+    member_name: str,
+    dest: str,
+    progress_callback: utils.ProgressCallback,
+) -> None:
+    """Extract a single file from a remote .tar.gz while it downloads.
+
+    The archive itself is never written to disk, only `member_name` ends up
+    at `dest`. The transfer stops as soon as the member has been extracted.
+    """
+    chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=16)
+    extracted = threading.Event()
+
+    def _extract() -> None:
+        try:
+            _extract_member(chunks, member_name, dest)
+        finally:
+            extracted.set()
+
+    def _put_blocking(chunk: Optional[bytes]) -> bool:
+        # the extractor may stop reading with the queue full, so wake up now and then
+        while not extracted.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    extract = asyncio.ensure_future(asyncio.to_thread(_extract))
+
+    async def _put(chunk: Optional[bytes]) -> bool:
+        # returns False once the extractor no longer needs data
+        if extracted.is_set():
+            return False
+        try:
+            chunks.put_nowait(chunk)
+            return True
+        except queue.Full:
+            # wait for room in a worker thread rather than polling the loop
+            return await asyncio.to_thread(_put_blocking, chunk)
+
+    await progress_callback(0)
+    try:
+        session = http_client.get_session()
+        async with session.get(url) as response:
+            response.raise_for_status()
+            total = int(response.headers.get("Content-Length", 0))
+            logger.debug(f"streaming: {url} ({total} bytes), extracting {member_name}")
+            progress = _Progress(total, 0, progress_callback)
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if not await _put(chunk):
+                    break
+                await progress.add(len(chunk))
+        await _put(None)
+        await extract
+    except BaseException:
+        if not extract.done():
+            # unblock the extractor so the worker thread can exit
+            while True:
+                try:
+                    chunks.get_nowait()
+                except queue.Empty:
+                    break
+            chunks.put_nowait(None)
+        await asyncio.gather(extract, return_exceptions=True)
+        try:
+            os.remove(dest)
+        except FileNotFoundError:
+            pass
+        raise
+    await progress_callback(-1)
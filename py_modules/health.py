@@ -0,0 +1,216 @@
+import asyncio
+from collections import deque
+import os
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from decky import logger
+from core import CoreController
+from setting import Settings, get_settings
+
+HealthCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+TunLookup = Callable[[], List[str]]
+
+SYS_NET = "/sys/class/net"
+
+
+def scan_tun_interfaces() -> List[str]:
+    try:
+        names = os.listdir(SYS_NET)
+    except OSError:
+        return []
+    return [n for n in names if os.path.exists(os.path.join(SYS_NET, n, "tun_flags"))]
+
+
+def _read_counter(ifname: str, name: str) -> int:
+    try:
+        with open(os.path.join(SYS_NET, ifname, "statistics", name), "r") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 0
+
+
+async def probe_http(port: int, host: str = "127.0.0.1", timeout: float = 2.0) -> Dict[str, Any]:
+    """Connect to the web controller and request /, any HTTP response counts as serving"""
+    result: Dict[str, Any] = {"tcp": False, "http": False, "connect": None, "response": None}
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        result["error"] = f"connect failed: {e or type(e).__name__}"
+        return result
+    result["tcp"] = True
+    result["connect"] = time.perf_counter() - started
+    try:
+        writer.write(f"GET / HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        result["http"] = line.startswith(b"HTTP/")
+        result["response"] = time.perf_counter() - started
+        if not result["http"]:
+            result["error"] = "no HTTP response"
+    except (OSError, asyncio.TimeoutError) as e:
+        result["error"] = f"request failed: {e or type(e).__name__}"
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    return result
+
+
+class HealthMonitor:
+    """Periodically checks that a running core is actually serving.
+
+    Every interval the web controller is probed over TCP and HTTP and the TUN
+    interface is looked up together with its traffic counters. After
+    `health_failures` failed checks in a row the core is marked degraded,
+    and restarted when `health_restart` is on. A short history of checks is
+    kept for the panel.
+    """
+
+    # a fresh core needs a moment to create its TUN interface and join the network
+    STARTUP_GRACE = 30.0
+    HISTORY_SIZE = 60
+
+    def __init__(
+        self,
+        core: CoreController,
+        settings: Optional[Settings] = None,
+        tun_interfaces: TunLookup = scan_tun_interfaces,
+    ):
+        self.core = core
+        self.settings = settings or get_settings()
+        self._tun_interfaces = tun_interfaces
+        self._task: Optional[asyncio.Task] = None
+        self._callback: Optional[HealthCallback] = None
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=self.HISTORY_SIZE)
+        self._failures = 0
+        self._status = "unknown"
+        self._counters: Dict[str, int] = {}
+        self._last_traffic: Optional[float] = None
+        self._run_started: Optional[float] = None
+
+    def _get(self, key: str, default: Any) -> Any:
+        value = self.settings.getSetting(key)
+        return default if value is None else value
+
+    def set_callback(self, callback: Optional[HealthCallback]) -> None:
+        self._callback = callback
+
+    def start(self) -> "HealthMonitor":
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(float(self._get("health_interval", 10.0)))
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"health check failed with {type(e).__name__} {e}")
+
+    def _reset(self) -> None:
+        self._failures = 0
+        self._counters = {}
+        self._last_traffic = None
+
+    async def check(self) -> Dict[str, Any]:
+        port = self.core.port
+        if port is None:
+            if self._status != "unknown":
+                self._reset()
+                await self._set_status("unknown")
+            return self.report()
+
+        started_at = time.time() - self.core.uptime
+        if self._run_started is None or abs(started_at - self._run_started) > 1.0:
+            # a new run of the core, forget the previous one
+            self._run_started = started_at
+            self._reset()
+
+        probe = await probe_http(port)
+        entry: Dict[str, Any] = {
+            "time": time.time(),
+            "tcp": probe["tcp"],
+            "http": probe["http"],
+            "latency": probe["response"] or probe["connect"],
+        }
+        errors = [probe["error"]] if "error" in probe else []
+        entry.update(self._check_tun())
+        in_grace = self.core.uptime < self.STARTUP_GRACE
+        if not entry["tun"] and not in_grace:
+            errors.append("TUN interface missing")
+        entry["ok"] = not errors
+        entry["message"] = "; ".join(errors)
+        self._history.append(entry)
+
+        if entry["ok"]:
+            self._failures = 0
+            await self._set_status("healthy")
+        else:
+            self._failures += 1
+            logger.warning(f"core health check failed ({self._failures}): {entry['message']}")
+            if self._failures >= int(self._get("health_failures", 3)):
+                await self._set_status("degraded")
+                if self._get("health_restart", False):
+                    logger.warning("core is degraded, restarting")
+                    self._reset()
+                    try:
+                        await self.core.restart()
+                    except Exception as e:
+                        logger.error(f"failed to restart degraded core: {e}")
+        return self.report()
+
+    def _check_tun(self) -> Dict[str, Any]:
+        names = self._tun_interfaces()
+        if not names:
+            return {"tun": None, "rx_bytes": 0, "tx_bytes": 0}
+        name = names[0]
+        rx = _read_counter(name, "rx_bytes")
+        tx = _read_counter(name, "tx_bytes")
+        prev_rx = self._counters.get("rx", rx)
+        prev_tx = self._counters.get("tx", tx)
+        self._counters = {"rx": rx, "tx": tx}
+        now = time.time()
+        if rx != prev_rx or self._last_traffic is None:
+            self._last_traffic = now
+        return {
+            "tun": name,
+            "rx_bytes": max(0, rx - prev_rx),
+            "tx_bytes": max(0, tx - prev_tx),
+        }
+
+    async def _set_status(self, status: str) -> None:
+        if status == self._status:
+            return
+        logger.info(f"core health: {self._status} -> {status}")
+        self._status = status
+        self.core.set_degraded(status == "degraded")
+        if self._callback is not None:
+            try:
+                await self._callback(self.report())
+            except Exception as e:
+                logger.error(f"error in health callback: {e}")
+
+    def report(self) -> Dict[str, Any]:
+        latencies = [e["latency"] for e in self._history if e["latency"] is not None]
+        return {
+            "status": self._status,
+            "failures": self._failures,
+            "latency": latencies[-1] if latencies else None,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "idle_for": time.time() - self._last_traffic
+            if self._last_traffic is not None
+            else None,
+            "history": list(self._history),
+        }
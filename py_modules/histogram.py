@@ -0,0 +1,75 @@
+from array import array
+import math
+from typing import Any, Dict, Optional
+
+
+class LatencyHistogram:
+    """Log bucketed latency histogram, a fixed array of counters.
+
+    Bucket i covers [MIN_MS * GROWTH**i, MIN_MS * GROWTH**(i+1)) and is
+    reported by its geometric middle, so a percentile is off from the exact
+    sample value by at most half a bucket, about 2.5%.
+    """
+
+    MIN_MS = 0.05
+    GROWTH = 1.05
+    BUCKETS = 280  # up to ~45s
+
+    def __init__(self):
+        self._counts = array("I", bytes(4 * self.BUCKETS))
+        self._log_growth = math.log(self.GROWTH)
+        self.count = 0
+        self.lost = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.total = 0.0
+        self.last: Optional[float] = None
+
+    def _index(self, ms: float) -> int:
+        if ms <= self.MIN_MS:
+            return 0
+        index = int(math.log(ms / self.MIN_MS) / self._log_growth)
+        return min(index, self.BUCKETS - 1)
+
+    def _value(self, index: int) -> float:
+        # geometric middle of the bucket
+        return self.MIN_MS * self.GROWTH ** (index + 0.5)
+
+    def record(self, ms: float) -> None:
+        self._counts[self._index(ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.last = ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def record_loss(self) -> None:
+        self.lost += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                value = self._value(index)
+                assert self.min is not None and self.max is not None
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        sent = self.count + self.lost
+        return {
+            "count": self.count,
+            "lost": self.lost,
+            "loss": self.lost / sent if sent else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.total / self.count if self.count else None,
+            "last": self.last,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from decky import logger
+import utils
+
+if TYPE_CHECKING:
+    import aiohttp
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+# aiohttp is only imported on the first request, it is heavy and rarely needed
+_session: Optional["aiohttp.ClientSession"] = None
+
+
+def get_session() -> "aiohttp.ClientSession":
+    """The plugin wide session, keep-alive connections and DNS results are
+    pooled per host and reused by every request"""
+    import aiohttp
+
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                ssl=utils.get_ssl_context(),
+                limit=16,
+                limit_per_host=8,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            ),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+            auto_decompress=True,
+        )
+    return _session
+
+
+async def close() -> None:
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def fetch(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    retries: int = DEFAULT_RETRIES,
+) -> Tuple[int, bytes, Dict[str, str]]:
+    """GET url and return status, body and headers.
+
+    Connection errors, timeouts and 5xx responses are retried with
+    exponential backoff, any other status is returned to the caller.
+    """
+    import aiohttp
+
+    client_timeout = aiohttp.ClientTimeout(total=timeout or DEFAULT_TIMEOUT)
+    attempt = 0
+    while True:
+        try:
+            async with get_session().get(
+                url, headers=headers, timeout=client_timeout
+            ) as response:
+                body = await response.read()
+                if response.status < 500 or attempt >= retries:
+                    return response.status, body, dict(response.headers)
+                error = f"status {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            error = f"{type(e).__name__} {e}"
+        attempt += 1
+        delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+        logger.debug(f"fetch: {url} failed with {error}, retrying in {delay}s")
+        await asyncio.sleep(delay)
+
+
+def _raise_for_status(url: str, status: int) -> None:
+    if status >= 400:
+        raise RuntimeError(f"GET {url} failed with status {status}")
+
+
+async def get_text(url: str, timeout: Optional[float] = None) -> str:
+    status, body, _ = await fetch(url, timeout=timeout)
+    _raise_for_status(url, status)
+    return body.decode()
+
+
+async def get_json(url: str, timeout: Optional[float] = None) -> Any:
+    return json.loads(await get_text(url, timeout=timeout))
+
+
+async def get_conditional(
+    url: str, headers: Dict[str, str], timeout: Optional[float] = None
+) -> Tuple[int, str, Dict[str, str]]:
+    """GET url with extra (conditional) headers, a 304 is returned rather than raised"""
+    status, body, resp_headers = await fetch(url, headers=headers, timeout=timeout)
+    if status != 304:
+        _raise_for_status(url, status)
+    return status, body.decode(), resp_headers
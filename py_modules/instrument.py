@@ -0,0 +1,175 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+import functools
+import json
+import os
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, TextIO, TypeVar
+
+import decky
+from decky import logger
+from histogram import LatencyHistogram
+
+F = TypeVar("F", bound=Callable[..., Any])
+C = TypeVar("C", bound=type)
+
+SPAN_LOG_PATH = os.path.join(decky.DECKY_PLUGIN_LOG_DIR, "spans.jsonl")
+RECENT_SPANS = 200
+
+# checked on every instrumented call, when off the cost is this one lookup
+_enabled = False
+_stats: Dict[str, "_Stats"] = {}
+_recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_SPANS)
+_span_log: Optional[TextIO] = None
+
+
+class _Stats:
+    __slots__ = ("calls", "errors", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.histogram = LatencyHistogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        latency = self.histogram.to_dict()
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": latency["avg"],
+            "max_ms": latency["max"],
+            "p50_ms": latency["p50"],
+            "p95_ms": latency["p95"],
+            "p99_ms": latency["p99"],
+        }
+
+
+def configure(enabled: bool, span_log: bool = False) -> None:
+    global _enabled, _span_log
+    _enabled = enabled
+    if span_log and enabled and _span_log is None:
+        try:
+            _span_log = open(SPAN_LOG_PATH, "a", buffering=64 * 1024)
+        except OSError as e:
+            logger.error(f"failed to open span log {SPAN_LOG_PATH}: {e}")
+    elif not (span_log and enabled) and _span_log is not None:
+        _span_log.close()
+        _span_log = None
+    logger.debug(f"instrumentation enabled={enabled} span_log={_span_log is not None}")
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _record(name: str, started: float, error: Optional[BaseException]) -> None:
+    duration = (time.perf_counter() - started) * 1000
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = _Stats()
+    stats.calls += 1
+    stats.histogram.record(duration)
+    span = {"name": name, "time": time.time(), "ms": duration}
+    if error is not None and not isinstance(error, asyncio.CancelledError):
+        stats.errors += 1
+        span["error"] = type(error).__name__
+    _recent.append(span)
+    if _span_log is not None:
+        _span_log.write(json.dumps(span) + "\n")
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block, also inside coroutines"""
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    error: Optional[BaseException] = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _record(name, started, error)
+
+
+def instrumented(name: str) -> Callable[[F], F]:
+    """Decorator recording calls, errors and latency of a function or coroutine"""
+
+    def decorator(func: F) -> F:
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                error: Optional[BaseException] = None
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    _record(name, started, error)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            error: Optional[BaseException] = None
+            try:
+                return func(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _record(name, started, error)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def instrument_methods(prefix: str) -> Callable[[C], C]:
+    """Class decorator instrumenting every coroutine method as "<prefix>.<name>",
+    the plugin loader calls these as RPCs"""
+
+    def decorator(cls: C) -> C:
+        for attr, value in list(vars(cls).items()):
+            if asyncio.iscoroutinefunction(value) and not attr.startswith("__"):
+                setattr(cls, attr, instrumented(f"{prefix}.{attr}")(value))
+        return cls
+
+    return decorator
+
+
+def snapshot(reset: bool = False) -> Dict[str, Any]:
+    result = {
+        "enabled": _enabled,
+        "span_log": SPAN_LOG_PATH if _span_log is not None else None,
+        "stats": {name: stats.to_dict() for name, stats in sorted(_stats.items())},
+    }
+    if reset:
+        _stats.clear()
+    if _span_log is not None:
+        _span_log.flush()
+    return result
+
+
+def recent_spans(limit: int = 50) -> list:
+    spans = list(_recent)
+    return spans[-limit:] if limit > 0 else []
+
+
+def close() -> None:
+    global _span_log
+    if _span_log is not None:
+        _span_log.close()
+        _span_log = None
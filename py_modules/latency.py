@@ -0,0 +1,215 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from decky import logger
+from core import CoreController
+from histogram import LatencyHistogram
+from setting import Settings, get_settings
+
+TunLookup = Callable[[], List[str]]
+
+# traceroute's base port, nothing listens there so peers answer with RST / ICMP
+# port unreachable, which takes one round trip just like a real reply
+DEFAULT_PROBE_PORT = 33434
+PROBE_PAYLOAD = b"decky-natpierce-probe"
+
+
+async def tcp_rtt(host: str, port: int, timeout: float) -> Optional[float]:
+    """Round trip of a TCP handshake in ms, a refused connection counts too"""
+    started = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        return (time.perf_counter() - started) * 1000
+    except (OSError, asyncio.TimeoutError):
+        return None
+    rtt = (time.perf_counter() - started) * 1000
+    writer.close()
+    return rtt
+
+
+class _UdpProbe(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.answer: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        if not self.answer.done():
+            self.answer.set_result(None)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable surfaces as ConnectionRefusedError
+        if not self.answer.done():
+            self.answer.set_result(None if isinstance(exc, ConnectionRefusedError) else exc)
+
+
+async def udp_rtt(host: str, port: int, timeout: float) -> Optional[float]:
+    """Round trip of a UDP datagram in ms, answered by an echo or by ICMP
+    port unreachable"""
+    loop = asyncio.get_running_loop()
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(
+            _UdpProbe, remote_addr=(host, port)
+        )
+    except OSError:
+        return None
+    try:
+        started = time.perf_counter()
+        transport.sendto(PROBE_PAYLOAD)
+        error = await asyncio.wait_for(protocol.answer, timeout)
+        if error is not None:
+            return None
+        return (time.perf_counter() - started) * 1000
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        transport.close()
+
+
+def read_tun_peers(ifname: str) -> List[str]:
+    """Peers reachable over the interface, from the neighbour and route tables"""
+    peers: List[str] = []
+    try:
+        with open("/proc/net/arp", "r") as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 6 and fields[5] == ifname:
+                    peers.append(fields[0])
+    except OSError:
+        pass
+    try:
+        with open("/proc/net/route", "r") as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[0] == ifname and fields[2] != "00000000":
+                    gateway = bytes.fromhex(fields[2])[::-1]
+                    peers.append(".".join(str(b) for b in gateway))
+    except (OSError, ValueError):
+        pass
+    return list(dict.fromkeys(peers))
+
+
+def parse_peers(value: str, default_port: int) -> List[Tuple[str, int]]:
+    """Parse "host[:port], ..." from the latency_peers setting"""
+    peers = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, sep, port = item.rpartition(":")
+        # a bare IPv6 address has several colons, a port needs [addr]:port
+        bare_v6 = item.count(":") > 1 and not item.startswith("[")
+        if sep and port.isdigit() and not bare_v6:
+            peers.append((host.strip("[]"), int(port)))
+        else:
+            peers.append((item.strip("[]"), default_port))
+    return peers
+
+
+class LatencyProber:
+    """Measures round trips to the core's controller and to the tunnel peers.
+
+    Every `latency_interval` seconds all targets are probed concurrently
+    with a TCP handshake and a UDP datagram, the results go to one
+    LatencyHistogram per target and protocol. Comparing the loopback
+    "core" target with the peers tells a slow core from a slow path.
+    """
+
+    PROBE_TIMEOUT = 2.0
+
+    def __init__(
+        self,
+        core: CoreController,
+        settings: Optional[Settings] = None,
+        tun_interfaces: Optional[TunLookup] = None,
+    ):
+        self.core = core
+        self.settings = settings or get_settings()
+        self._tun_interfaces = tun_interfaces or (lambda: [])
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_run: Optional[float] = None
+
+    def _get(self, key: str, default: Any) -> Any:
+        value = self.settings.getSetting(key)
+        return default if value is None else value
+
+    def start(self) -> "LatencyProber":
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            interval = float(self._get("latency_interval", 30.0))
+            await asyncio.sleep(interval if interval > 0 else 30.0)
+            if interval <= 0 or not self.core.is_running:
+                continue
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"latency probe failed with {type(e).__name__} {e}")
+
+    def targets(self) -> Dict[str, Dict[str, Any]]:
+        port = int(self._get("latency_probe_port", DEFAULT_PROBE_PORT))
+        targets: Dict[str, Dict[str, Any]] = {}
+        if self.core.port is not None:
+            targets["core"] = {"kind": "core", "host": "127.0.0.1", "port": self.core.port}
+        for name in self._tun_interfaces():
+            for host in read_tun_peers(name):
+                targets[host] = {"kind": "peer", "host": host, "port": port, "ifname": name}
+        for host, peer_port in parse_peers(self._get("latency_peers", ""), port):
+            targets[f"{host}:{peer_port}"] = {"kind": "peer", "host": host, "port": peer_port}
+        return targets
+
+    def _histogram(self, name: str, proto: str) -> LatencyHistogram:
+        key = (name, proto)
+        if key not in self._histograms:
+            self._histograms[key] = LatencyHistogram()
+        return self._histograms[key]
+
+    async def _probe(self, name: str, target: Dict[str, Any]) -> None:
+        probes = [("tcp", tcp_rtt(target["host"], target["port"], self.PROBE_TIMEOUT))]
+        if target["kind"] == "peer":
+            probes.append(("udp", udp_rtt(target["host"], target["port"], self.PROBE_TIMEOUT)))
+        results = await asyncio.gather(*(p for _, p in probes))
+        for (proto, _), rtt in zip(probes, results):
+            histogram = self._histogram(name, proto)
+            if rtt is None:
+                histogram.record_loss()
+            else:
+                histogram.record(rtt)
+
+    async def probe_all(self) -> Dict[str, Any]:
+        self._targets = self.targets()
+        await asyncio.gather(
+            *(self._probe(name, target) for name, target in self._targets.items())
+        )
+        self._last_run = time.time()
+        return self.report()
+
+    def reset(self) -> None:
+        self._histograms.clear()
+
+    def report(self) -> Dict[str, Any]:
+        targets = []
+        for name, target in self._targets.items():
+            targets.append(
+                {
+                    "name": name,
+                    **target,
+                    "tcp": self._histogram(name, "tcp").to_dict(),
+                    "udp": self._histograms[(name, "udp")].to_dict()
+                    if (name, "udp") in self._histograms
+                    else None,
+                }
+            )
+        return {"time": self._last_run, "targets": targets}
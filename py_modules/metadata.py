@@ -1,4 +1,15 @@
+from enum import Enum
+
 PACKAGE_NAME = "DeckyNatpierce"
 PACKAGE_REPO = "honjow/decky-natpierce"
 CORE_REPO = "natpierce"
 DEFAILT_PORT = 33272
+
+
+class ResourceType(Enum):
+    PLUGIN = "plugin"
+    CORE = "core"
+
+
+RESOURCE_TYPE_ENUMS = [ResourceType.PLUGIN, ResourceType.CORE]
+RESOURCE_TYPE_VALUES = [e.value for e in RESOURCE_TYPE_ENUMS]
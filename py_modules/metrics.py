@@ -0,0 +1,229 @@
+import asyncio
+from array import array
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from decky import logger
+from core import CoreController
+from setting import Settings, get_settings
+
+MetricsCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+TunLookup = Callable[[], List[str]]
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+FIELDS = (
+    "time",
+    "cpu_ticks",
+    "rss",
+    "threads",
+    "read_bytes",
+    "write_bytes",
+    "rx_bytes",
+    "tx_bytes",
+    "rx_packets",
+    "tx_packets",
+)
+
+
+class SampleRing:
+    """Fixed capacity ring of samples, one preallocated double array per field"""
+
+    def __init__(self, fields: Sequence[str], capacity: int):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._columns = {f: array("d", bytes(8 * capacity)) for f in self.fields}
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        self._next = 0
+        self._count = 0
+
+    def append(self, sample: Dict[str, float]) -> None:
+        for field in self.fields:
+            self._columns[field][self._next] = sample.get(field, 0.0)
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def get(self, index: int) -> Dict[str, float]:
+        """Sample by age, 0 is the oldest and -1 the newest"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        slot = (self._next - self._count + index) % self.capacity
+        return {f: self._columns[f][slot] for f in self.fields}
+
+
+def read_proc_stat(pid: int) -> Dict[str, float]:
+    with open(f"/proc/{pid}/stat", "r") as f:
+        data = f.read()
+    # the command name may contain spaces and parentheses, fields start after the last ")"
+    rest = data[data.rindex(")") + 2 :].split()
+    return {
+        "cpu_ticks": float(int(rest[11]) + int(rest[12])),
+        "threads": float(rest[17]),
+    }
+
+
+def read_proc_status(pid: int) -> Dict[str, float]:
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return {"rss": float(line.split()[1]) * 1024}
+    return {"rss": 0.0}
+
+
+def read_proc_io(pid: int) -> Dict[str, float]:
+    result = {"read_bytes": 0.0, "write_bytes": 0.0}
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in result:
+                    result[key] = float(value)
+    except PermissionError:
+        pass
+    return result
+
+
+def read_net_dev(ifname: str, path: str = "/proc/net/dev") -> Dict[str, float]:
+    with open(path, "r") as f:
+        for line in f:
+            name, sep, values = line.partition(":")
+            if sep and name.strip() == ifname:
+                v = values.split()
+                return {
+                    "rx_bytes": float(v[0]),
+                    "rx_packets": float(v[1]),
+                    "tx_bytes": float(v[8]),
+                    "tx_packets": float(v[9]),
+                }
+    return {}
+
+
+def compute_rates(prev: Dict[str, float], cur: Dict[str, float]) -> Dict[str, Any]:
+    """Rates between two samples, RSS and thread count are taken from the newer one"""
+    dt = cur["time"] - prev["time"]
+    if dt <= 0:
+        dt = 1e-9
+
+    def rate(field: str) -> float:
+        # counters reset when the core restarts or the TUN interface is recreated
+        return max(0.0, cur[field] - prev[field]) / dt
+
+    return {
+        "time": cur["time"],
+        "cpu_percent": rate("cpu_ticks") / CLK_TCK * 100,
+        "rss": int(cur["rss"]),
+        "threads": int(cur["threads"]),
+        "read_bps": rate("read_bytes"),
+        "write_bps": rate("write_bytes"),
+        "rx_bps": rate("rx_bytes"),
+        "tx_bps": rate("tx_bytes"),
+        "rx_pps": rate("rx_packets"),
+        "tx_pps": rate("tx_packets"),
+    }
+
+
+class MetricsSampler:
+    """Samples the core's resource usage and TUN traffic every
+    `metrics_interval` seconds into a SampleRing, 0 disables sampling"""
+
+    CAPACITY = 720
+
+    def __init__(
+        self,
+        core: CoreController,
+        settings: Optional[Settings] = None,
+        tun_interfaces: Optional[TunLookup] = None,
+        capacity: int = CAPACITY,
+    ):
+        self.core = core
+        self.settings = settings or get_settings()
+        self._tun_interfaces = tun_interfaces or (lambda: [])
+        self._ring = SampleRing(FIELDS, capacity)
+        self._pid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._callback: Optional[MetricsCallback] = None
+
+    def _interval(self) -> float:
+        value = self.settings.getSetting("metrics_interval")
+        return 5.0 if value is None else float(value)
+
+    def set_callback(self, callback: Optional[MetricsCallback]) -> None:
+        self._callback = callback
+
+    def start(self) -> "MetricsSampler":
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            interval = self._interval()
+            await asyncio.sleep(interval if interval > 0 else 5.0)
+            if interval <= 0:
+                continue
+            try:
+                rates = self.sample()
+            except Exception as e:
+                logger.error(f"metrics sample failed with {type(e).__name__} {e}")
+                continue
+            if rates is not None and self._callback is not None:
+                try:
+                    await self._callback(rates)
+                except Exception as e:
+                    logger.error(f"error in metrics callback: {e}")
+
+    def sample(self) -> Optional[Dict[str, Any]]:
+        """Take one sample, return the rates since the previous one"""
+        pid = self.core.pid
+        if pid is None:
+            self._pid = None
+            return None
+        if pid != self._pid:
+            # a new core process, its counters start from zero
+            self._pid = pid
+            self._ring.clear()
+        sample: Dict[str, float] = {"time": time.time()}
+        try:
+            sample.update(read_proc_stat(pid))
+            sample.update(read_proc_status(pid))
+            sample.update(read_proc_io(pid))
+        except (FileNotFoundError, ProcessLookupError):
+            return None
+        names = self._tun_interfaces()
+        if names:
+            sample.update(read_net_dev(names[0]))
+        self._ring.append(sample)
+        if len(self._ring) < 2:
+            return None
+        return compute_rates(self._ring.get(-2), self._ring.get(-1))
+
+    def rates(self, limit: int = 60) -> List[Dict[str, Any]]:
+        count = len(self._ring)
+        start = max(1, count - limit)
+        return [
+            compute_rates(self._ring.get(i - 1), self._ring.get(i))
+            for i in range(start, count)
+        ]
+
+    def report(self, limit: int = 60) -> Dict[str, Any]:
+        rates = self.rates(limit)
+        return {
+            "pid": self._pid,
+            "interval": self._interval(),
+            "latest": rates[-1] if rates else None,
+            "samples": rates,
+        }
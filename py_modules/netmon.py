@@ -0,0 +1,265 @@
+import asyncio
+import os
+import socket
+import struct
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from decky import logger
+
+# rtnetlink constants, see linux/netlink.h, linux/rtnetlink.h and linux/if_addr.h
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RT_SCOPE_HOST = 254
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTATTR = struct.Struct("=HH")
+
+_VIRTUAL_PREFIXES = ("docker", "br-", "veth", "virbr", "vmnet", "vboxnet")
+_WIRELESS_PREFIXES = ("wlan", "wl")
+_WIRED_PREFIXES = ("eth", "en")
+
+ChangeCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# (ifindex, family, address) -> entry
+AddressKey = Tuple[int, int, str]
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _is_tun(ifname: str) -> bool:
+    return os.path.exists(f"/sys/class/net/{ifname}/tun_flags")
+
+
+def _rank(entry: Dict[str, Any]) -> Tuple[int, int, int]:
+    """Lower is better, IPv4 on a physical interface comes first"""
+    name = entry["ifname"]
+    if name.startswith(_WIRELESS_PREFIXES):
+        kind = 0
+    elif name.startswith(_WIRED_PREFIXES):
+        kind = 1
+    elif name.startswith(_VIRTUAL_PREFIXES):
+        kind = 3
+    else:
+        kind = 2
+    return (0 if entry["family"] == 4 else 1, entry["scope"], kind)
+
+
+def parse_addr_messages(data: bytes) -> List[Tuple[int, Dict[str, Any]]]:
+    """Parse a netlink datagram into (message type, address entry) pairs"""
+    result = []
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        if msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            body = offset + _NLMSGHDR.size
+            family, prefixlen, _, scope, index = _IFADDRMSG.unpack_from(data, body)
+            attrs: Dict[int, bytes] = {}
+            pos = body + _align(_IFADDRMSG.size)
+            end = offset + length
+            while pos + _RTATTR.size <= end:
+                attr_len, attr_type = _RTATTR.unpack_from(data, pos)
+                if attr_len < _RTATTR.size:
+                    break
+                attrs[attr_type] = data[pos + _RTATTR.size : pos + attr_len]
+                pos += _align(attr_len)
+            raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+            if raw is not None and family in (socket.AF_INET, socket.AF_INET6):
+                label = attrs.get(IFA_LABEL)
+                if label:
+                    ifname = label.rstrip(b"\x00").decode(errors="replace")
+                else:
+                    try:
+                        ifname = socket.if_indextoname(index)
+                    except OSError:
+                        ifname = str(index)
+                result.append(
+                    (
+                        msg_type,
+                        {
+                            "ifname": ifname,
+                            "index": index,
+                            "family": 4 if family == socket.AF_INET else 6,
+                            "address": socket.inet_ntop(family, raw),
+                            "prefixlen": prefixlen,
+                            "scope": scope,
+                        },
+                    )
+                )
+        offset += _align(length)
+    return result
+
+
+class NetworkMonitor:
+    """Keeps a table of every interface address, updated from rtnetlink.
+
+    The table is filled with one RTM_GETADDR dump and then kept current from
+    address change notifications, so lookups never touch the network.
+    """
+
+    def __init__(self):
+        self._sock: Optional[socket.socket] = None
+        self._addresses: Dict[AddressKey, Dict[str, Any]] = {}
+        self._callback: Optional[ChangeCallback] = None
+        self._notify_handle: Optional[asyncio.Handle] = None
+        self._last_snapshot: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._sock is not None
+
+    def set_change_callback(self, callback: Optional[ChangeCallback]) -> None:
+        self._callback = callback
+
+    def start(self) -> None:
+        if self._sock is not None:
+            return
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            self._dump(sock)
+        except Exception as e:
+            logger.error(f"netmon: failed to start with {e}")
+            return
+        sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+        self._sock = sock
+        self._last_snapshot = self.snapshot()
+        logger.debug(f"netmon: started with {len(self._addresses)} addresses")
+
+    def stop(self) -> None:
+        if self._sock is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        except RuntimeError:
+            pass
+        self._sock.close()
+        self._sock = None
+
+    def _dump(self, sock: socket.socket) -> None:
+        request = _NLMSGHDR.pack(
+            _NLMSGHDR.size + _IFADDRMSG.size,
+            RTM_GETADDR,
+            NLM_F_REQUEST | NLM_F_DUMP,
+            1,
+            0,
+        ) + _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        sock.settimeout(1.0)
+        sock.send(request)
+        while True:
+            data = sock.recv(65536)
+            self._apply(parse_addr_messages(data))
+            _, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, self._last_header(data))
+            if msg_type in (NLMSG_DONE, NLMSG_ERROR):
+                break
+
+    @staticmethod
+    def _last_header(data: bytes) -> int:
+        offset = last = 0
+        while offset + _NLMSGHDR.size <= len(data):
+            length = _NLMSGHDR.unpack_from(data, offset)[0]
+            if length < _NLMSGHDR.size:
+                break
+            last = offset
+            offset += _align(length)
+        return last
+
+    def _apply(self, messages: List[Tuple[int, Dict[str, Any]]]) -> bool:
+        changed = False
+        for msg_type, entry in messages:
+            key = (entry["index"], entry["family"], entry["address"])
+            if msg_type == RTM_NEWADDR:
+                entry["tun"] = _is_tun(entry["ifname"])
+                changed = changed or self._addresses.get(key) != entry
+                self._addresses[key] = entry
+            elif self._addresses.pop(key, None) is not None:
+                changed = True
+        return changed
+
+    def _on_readable(self) -> None:
+        assert self._sock is not None
+        changed = False
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                # ENOBUFS means notifications were dropped, resync with a dump
+                logger.warning(f"netmon: {e}, resyncing")
+                self._resync()
+                changed = True
+                break
+            changed = self._apply(parse_addr_messages(data)) or changed
+        if changed and self._notify_handle is None:
+            # coalesce bursts, e.g. an interface going down drops all its addresses
+            self._notify_handle = asyncio.get_running_loop().call_later(
+                0.2, self._notify
+            )
+
+    def _resync(self) -> None:
+        self.stop()
+        self._addresses.clear()
+        self.start()
+
+    def _notify(self) -> None:
+        self._notify_handle = None
+        snapshot = self.snapshot()
+        if snapshot == self._last_snapshot:
+            return
+        self._last_snapshot = snapshot
+        logger.debug("netmon: addresses changed, primary ip %s", snapshot["ip"])
+        if self._callback is not None:
+            asyncio.create_task(self._run_callback(snapshot))
+
+    async def _run_callback(self, snapshot: Dict[str, Any]) -> None:
+        assert self._callback is not None
+        try:
+            await self._callback(snapshot)
+        except Exception as e:
+            logger.error(f"error in netmon callback: {e}")
+
+    def addresses(self) -> List[Dict[str, Any]]:
+        """Every non-loopback address, best first"""
+        entries = [
+            dict(e)
+            for e in self._addresses.values()
+            if e["scope"] != RT_SCOPE_HOST and not e["ifname"].startswith("lo")
+        ]
+        entries.sort(key=_rank)
+        return entries
+
+    def primary_ip(self) -> Optional[str]:
+        for entry in self.addresses():
+            if entry["family"] == 4 and not entry["tun"]:
+                return entry["address"]
+        return None
+
+    def tun_addresses(self) -> List[Dict[str, Any]]:
+        return [e for e in self.addresses() if e["tun"]]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ip": self.primary_ip(),
+            "tun": self.tun_addresses(),
+            "addresses": self.addresses(),
+        }
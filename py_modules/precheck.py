@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from decky import logger
+import utils
+
+TUN_MODULE_PATH = "/sys/module/tun"
+TUN_DEVICE_PATH = "/dev/net/tun"
+IP_FORWARD_PATH = "/proc/sys/net/ipv4/ip_forward"
+
+
+class ProbeError(Exception):
+    pass
+
+
+class Probe:
+    """A single environment check.
+
+    fingerprint() must be cheap and never fork, it describes the state the
+    probe depends on. run() does the actual check and may try to fix the
+    environment, raising ProbeError when it can't. A passing result is reused
+    for as long as the fingerprint stays the same.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fingerprint: Callable[[], Hashable],
+        run: Callable[[], Awaitable[str]],
+    ):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.run = run
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _tun_fingerprint() -> Hashable:
+    return os.path.isdir(TUN_MODULE_PATH), os.path.exists(TUN_DEVICE_PATH)
+
+
+async def _check_tun() -> str:
+    if os.path.isdir(TUN_MODULE_PATH) or os.path.exists(TUN_DEVICE_PATH):
+        return "TUN module is loaded"
+
+    # only fork when the module actually needs loading
+    logger.info("TUN module not loaded, attempting to load...")
+    proc = await asyncio.create_subprocess_exec(
+        "modprobe",
+        "tun",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=utils.env_fix(),
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        error_msg = stderr.decode().strip() if stderr else "unknown error"
+        raise ProbeError(
+            f"Cannot load TUN module, may need root privileges: {error_msg}"
+        )
+    return "TUN module loaded successfully"
+
+
+def _ip_forward_fingerprint() -> Hashable:
+    return _read_text(IP_FORWARD_PATH)
+
+
+async def _check_ip_forward() -> str:
+    value = _read_text(IP_FORWARD_PATH)
+    if value is None:
+        raise ProbeError("System does not support IP forwarding")
+    if value == "1":
+        return "IP forwarding is already enabled"
+
+    logger.info("IP forwarding not enabled, attempting to enable...")
+    try:
+        with open(IP_FORWARD_PATH, "w") as f:
+            f.write("1")
+    except PermissionError:
+        raise ProbeError("Root privileges required to enable IP forwarding")
+    except OSError as e:
+        raise ProbeError(f"Cannot enable IP forwarding: {e}")
+    if _read_text(IP_FORWARD_PATH) != "1":
+        raise ProbeError("Failed to enable IP forwarding, status verification failed")
+    return "IP forwarding enabled successfully"
+
+
+DEFAULT_PROBES = [
+    Probe("tun", _tun_fingerprint, _check_tun),
+    Probe("ip_forward", _ip_forward_fingerprint, _check_ip_forward),
+]
+
+
+class PrecheckRunner:
+    """Runs the pre-start probes concurrently and caches passing results"""
+
+    def __init__(self, probes: Optional[List[Probe]] = None):
+        self.probes = probes if probes is not None else DEFAULT_PROBES
+        self._cache: Dict[str, Hashable] = {}
+        self._report: Dict[str, Any] = {}
+
+    @property
+    def report(self) -> Dict[str, Any]:
+        return self._report
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+    async def _run_probe(self, probe: Probe) -> Dict[str, Any]:
+        start = time.perf_counter()
+        fingerprint = probe.fingerprint()
+        result: Dict[str, Any] = {"name": probe.name, "cached": False}
+        if probe.name in self._cache and self._cache[probe.name] == fingerprint:
+            result.update(ok=True, cached=True, message=self._report_message(probe))
+        else:
+            self._cache.pop(probe.name, None)
+            try:
+                result.update(ok=True, message=await probe.run())
+                self._cache[probe.name] = probe.fingerprint()
+            except ProbeError as e:
+                result.update(ok=False, message=str(e))
+            except Exception as e:
+                result.update(ok=False, message=f"{probe.name} check failed: {e}")
+        result["duration"] = time.perf_counter() - start
+        return result
+
+    def _report_message(self, probe: Probe) -> str:
+        for result in self._report.get("probes", []):
+            if result["name"] == probe.name:
+                return result["message"]
+        return ""
+
+    async def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._run_probe(p) for p in self.probes))
+        self._report = {
+            "ok": all(r["ok"] for r in results),
+            "time": time.time(),
+            "duration": time.perf_counter() - start,
+            "probes": list(results),
+        }
+        for r in results:
+            log = logger.info if r["ok"] else logger.error
+            log(f"precheck {r['name']}: {r['message']}")
+        return self._report
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict
+
+import decky
+from decky import logger
+import http_client
+
+CACHE_PATH = os.path.join(decky.DECKY_PLUGIN_RUNTIME_DIR, "releases.json")
+
+ParseCallback = Callable[[str], str]
+
+
+class ReleaseCache:
+    """Persistent cache of the latest release tag per resource.
+
+    Entries younger than max_age are returned as is. Older entries are
+    returned at once too and revalidated in the background, unless the
+    caller asks for a fresh answer, only a missing entry always waits for
+    the network. Revalidation uses If-None-Match / If-Modified-Since, so an
+    unchanged release costs a 304 and does not count against GitHub's rate
+    limit. Concurrent lookups of the same key share one request, and a
+    failed request falls back to the stale entry when there is one.
+    """
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"release cache is invalid, starting empty: {e}")
+            return {}
+
+    def _save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"failed to save release cache: {e}")
+
+    def peek(self, key: str) -> str:
+        entry = self._entries.get(key)
+        return entry["tag"] if entry else ""
+
+    async def get(
+        self,
+        key: str,
+        url: str,
+        parse: ParseCallback,
+        timeout: float,
+        max_age: float,
+        stale_ok: bool = True,
+    ) -> str:
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry["fetched_at"] <= max_age:
+            return entry["tag"]
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._revalidate(key, url, parse, timeout))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda f: self._revalidated(key, f))
+        if entry is not None and stale_ok:
+            return entry["tag"]
+        return await asyncio.shield(inflight)
+
+    def _revalidated(self, key: str, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        # nobody may be waiting for a background revalidation
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"release lookup for {key} failed with {future.exception()}")
+
+    async def _revalidate(
+        self, key: str, url: str, parse: ParseCallback, timeout: float
+    ) -> str:
+        entry = self._entries.get(key)
+        headers = {}
+        if entry is not None and entry.get("url") == url:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            status, body, resp_headers = await http_client.get_conditional(
+                url, headers, timeout=timeout
+            )
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(f"release lookup for {key} failed with {e}, using cached {entry['tag']}")
+            return entry["tag"]
+
+        if status == 304 and entry is not None:
+            logger.debug(f"release lookup for {key}: not modified")
+            entry["fetched_at"] = time.time()
+        else:
+            entry = {
+                "url": url,
+                "tag": parse(body),
+                "etag": resp_headers.get("ETag"),
+                "last_modified": resp_headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self._entries[key] = entry
+        self._save()
+        return entry["tag"]
@@ -0,0 +1,245 @@
+import ctypes
+import os
+import platform
+import resource
+from typing import Any, Callable, Dict, Optional, Set
+
+from decky import logger
+from setting import SCHEMA, Settings
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+CGROUP_NAME = "decky-natpierce"
+
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_LEVELS = range(8)
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_WHO_PGRP = 2
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289}
+
+_libc: Optional[ctypes.CDLL] = None
+
+
+def _ioprio_set(which: int, who: int, ioprio: int) -> None:
+    global _libc
+    nr = _IOPRIO_SET.get(platform.machine())
+    if nr is None:
+        raise OSError(f"ioprio_set unsupported on {platform.machine()}")
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    if _libc.syscall(nr, which, who, ioprio) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def parse_cpu_list(value: str) -> Optional[Set[int]]:
+    """Parse a cpu list such as "0-3,6", empty means no restriction"""
+    value = value.strip()
+    if not value:
+        return None
+    cpus: Set[int] = set()
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def _ionice_class(value: Any) -> str:
+    value = value or ""
+    if value and value not in IOPRIO_CLASSES:
+        raise ValueError(f"invalid ionice class {value}")
+    return value
+
+
+def _ionice_level(value: Any) -> int:
+    level = int(value)
+    if level not in IOPRIO_LEVELS:
+        raise ValueError(f"invalid ionice level {value}, expected 0-7")
+    return level
+
+
+class ResourcePolicy:
+    """Scheduling and resource limits for the core process.
+
+    The policy is applied in the child between fork and exec via preexec(),
+    and the live adjustable parts (nice, ionice, affinity and cpu.max) can be
+    re-applied to a running core with apply_to(), e.g. when a game starts.
+    """
+
+    def __init__(
+        self,
+        nice: int = 0,
+        ionice_class: str = "",
+        ionice_level: int = 4,
+        affinity: Optional[Set[int]] = None,
+        rlimit_as: int = 0,
+        rlimit_nofile: int = 0,
+        cpu_max: str = "",
+    ):
+        if ionice_class and ionice_class not in IOPRIO_CLASSES:
+            raise ValueError(f"invalid ionice class {ionice_class}")
+        if ionice_level not in IOPRIO_LEVELS:
+            raise ValueError(f"invalid ionice level {ionice_level}, expected 0-7")
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.ionice_level = ionice_level
+        self.affinity = affinity
+        self.rlimit_as = rlimit_as
+        self.rlimit_nofile = rlimit_nofile
+        self.cpu_max = cpu_max
+        self.cgroup: Optional[str] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings, game_mode: bool = False) -> "ResourcePolicy":
+        """An invalid setting falls back to its default alone, the other
+        fields of the policy still apply"""
+        get = settings.getSetting
+
+        def field(key: str, parse: Callable[[Any], Any], default: Any) -> Any:
+            value = get(key)
+            try:
+                return parse(value)
+            except (TypeError, ValueError) as e:
+                logger.error(f"invalid {key} {value!r}, using default: {e}")
+                return default
+
+        policy = cls(
+            nice=field("core_nice", lambda v: int(v or 0), 0),
+            ionice_class=field("core_ionice_class", _ionice_class, ""),
+            ionice_level=field(
+                "core_ionice_level", _ionice_level, SCHEMA["core_ionice_level"]
+            ),
+            affinity=field("core_cpu_affinity", lambda v: parse_cpu_list(v or ""), None),
+            rlimit_as=field("core_rlimit_as", lambda v: int(v or 0), 0),
+            rlimit_nofile=field("core_rlimit_nofile", lambda v: int(v or 0), 0),
+            cpu_max=get("core_cpu_max") or "",
+        )
+        if game_mode:
+            # the game profile only ever tightens the normal one
+            policy.nice = max(policy.nice, field("game_mode_nice", lambda v: int(v or 0), 0))
+            policy.ionice_class = (
+                field("game_mode_ionice_class", _ionice_class, "") or policy.ionice_class
+            )
+            policy.affinity = (
+                field("game_mode_cpu_affinity", lambda v: parse_cpu_list(v or ""), None)
+                or policy.affinity
+            )
+            policy.cpu_max = get("game_mode_cpu_max") or policy.cpu_max
+        return policy
+
+    @property
+    def ioprio(self) -> Optional[int]:
+        if not self.ionice_class:
+            return None
+        return (IOPRIO_CLASSES[self.ionice_class] << IOPRIO_CLASS_SHIFT) | self.ionice_level
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "nice": self.nice,
+            "ionice_class": self.ionice_class,
+            "ionice_level": self.ionice_level,
+            "affinity": sorted(self.affinity) if self.affinity else None,
+            "rlimit_as": self.rlimit_as,
+            "rlimit_nofile": self.rlimit_nofile,
+            "cpu_max": self.cpu_max,
+            "cgroup": self.cgroup,
+        }
+
+    @property
+    def needs_preexec(self) -> bool:
+        # without a preexec_fn the child can be spawned without a full fork
+        return bool(
+            self.cgroup or self.nice or self.ionice_class or self.affinity
+            or self.rlimit_as > 0 or self.rlimit_nofile > 0
+        )
+
+    def prepare(self) -> None:
+        """Everything preexec() needs that is unsafe to do in the forked
+        child: creating the cgroup and loading libc for ioprio_set"""
+        global _libc
+        if self.ionice_class and _libc is None:
+            _libc = ctypes.CDLL(None, use_errno=True)
+        self.prepare_cgroup()
+
+    def prepare_cgroup(self) -> None:
+        """Create the core's cgroup v2 group with cpu.max"""
+        self.cgroup = None
+        if not self.cpu_max:
+            return
+        path = os.path.join(CGROUP_ROOT, CGROUP_NAME)
+        try:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "cpu.max"), "w") as f:
+                f.write(self.cpu_max)
+            self.cgroup = path
+        except OSError as e:
+            logger.warning(f"cgroup cpu.max {self.cpu_max} not applied: {e}")
+
+    def preexec(self) -> None:
+        """Runs in the forked child right before exec, must not log or raise
+        for a policy the kernel refuses, the core should still start"""
+        if self.cgroup:
+            try:
+                with open(os.path.join(self.cgroup, "cgroup.procs"), "w") as f:
+                    f.write(str(os.getpid()))
+            except OSError:
+                pass
+        if self.nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+            except OSError:
+                pass
+        ioprio = self.ioprio
+        if ioprio is not None:
+            try:
+                _ioprio_set(IOPRIO_WHO_PROCESS, 0, ioprio)
+            except OSError:
+                pass
+        if self.affinity:
+            try:
+                os.sched_setaffinity(0, self.affinity)
+            except OSError:
+                pass
+        for limit, value in (
+            (resource.RLIMIT_AS, self.rlimit_as),
+            (resource.RLIMIT_NOFILE, self.rlimit_nofile),
+        ):
+            if value > 0:
+                try:
+                    resource.setrlimit(limit, (value, value))
+                except (OSError, ValueError):
+                    pass
+
+    def apply_to(self, pid: int) -> None:
+        """Apply the live adjustable parts to a running core and its threads,
+        the core is the leader of its own process group"""
+        try:
+            os.setpriority(os.PRIO_PGRP, pid, self.nice)
+        except OSError as e:
+            logger.warning(f"failed to renice core: {e}")
+        try:
+            # class 0 returns to the default io priority derived from nice
+            _ioprio_set(IOPRIO_WHO_PGRP, pid, self.ioprio or 0)
+        except OSError as e:
+            logger.warning(f"failed to set core io priority: {e}")
+        affinity = self.affinity or set(range(os.cpu_count() or 1))
+        try:
+            for tid in os.listdir(f"/proc/{pid}/task"):
+                os.sched_setaffinity(int(tid), affinity)
+        except OSError as e:
+            logger.warning(f"failed to set core cpu affinity: {e}")
+        cgroup = os.path.join(CGROUP_ROOT, CGROUP_NAME)
+        if self.cpu_max:
+            self.prepare_cgroup()
+            if self.cgroup:
+                try:
+                    with open(os.path.join(self.cgroup, "cgroup.procs"), "w") as f:
+                        f.write(str(pid))
+                except OSError as e:
+                    logger.warning(f"failed to move core into {self.cgroup}: {e}")
+        elif os.path.isdir(cgroup):
+            try:
+                with open(os.path.join(cgroup, "cpu.max"), "w") as f:
+                    f.write("max")
+            except OSError as e:
+                logger.warning(f"failed to lift cpu.max of {cgroup}: {e}")
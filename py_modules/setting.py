@@ -1,20 +1,211 @@
-from typing import Any
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
 import decky
 from decky import logger
-from settings import SettingsManager
+from metadata import DEFAILT_PORT
+
+ChangeCallback = Callable[[str, Any], None]
+
+# every known setting with its default, the type of the default is the type of the setting
+SCHEMA: Dict[str, Any] = {
+    "timeout": 15.0,
+    "debounce_time": 10.0,
+    "autostart": False,
+    "controller_port": DEFAILT_PORT,
+    "costom_port": False,
+    # ports tried in order when costom_port is off
+    "port_range_start": DEFAILT_PORT,
+    "port_range_end": DEFAILT_PORT + 63,
+    "ready_timeout": 15.0,
+    "auto_check_update": True,
+    "disable_verify": False,
+    "core_version": "",
+    "log_level": logging.getLevelName(logging.INFO),
+    "supervise": True,
+    "stop_timeout": 5.0,
+    "core_log_max_bytes": 1024 * 1024,
+    "core_log_backups": 3,
+    "core_log_compress": True,
+    "update_check_interval": 6 * 60 * 60.0,
+    "prefetch_update": False,
+    "health_interval": 10.0,
+    "health_failures": 3,
+    "health_restart": False,
+    "metrics_interval": 5.0,
+    "latency_interval": 30.0,
+    "latency_probe_port": 33434,
+    # extra "host[:port]" peers to probe, comma separated
+    "latency_peers": "",
+    # per RPC call counts and latency, the span log goes to spans.jsonl
+    "instrumentation": False,
+    "instrumentation_span_log": False,
+    # resource policy of the core process, 0 or "" leaves the default
+    "core_nice": 0,
+    "core_ionice_class": "",
+    "core_ionice_level": 4,
+    "core_cpu_affinity": "",
+    "core_rlimit_as": 0,
+    "core_rlimit_nofile": 0,
+    "core_cpu_max": "",
+    # applied on top of the above while a game is running
+    "game_mode": True,
+    "game_mode_nice": 10,
+    "game_mode_ionice_class": "idle",
+    "game_mode_cpu_affinity": "",
+    "game_mode_cpu_max": "",
+}
+
+
+_TRUE_STRINGS = ("true", "1", "yes", "on")
+_FALSE_STRINGS = ("false", "0", "no", "off", "")
+
+
+def _parse_bool(key: str, value: Any) -> bool:
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE_STRINGS:
+            return True
+        if text in _FALSE_STRINGS:
+            return False
+    raise ValueError(f"invalid boolean for {key}: {value!r}")
+
+
+def _coerce(key: str, value: Any) -> Any:
+    default = SCHEMA.get(key)
+    if default is None or value is None or type(value) is type(default):
+        return value
+    if isinstance(default, bool):
+        return _parse_bool(key, value)
+    return type(default)(value)
 
 
 class Settings:
-    def __init__(self):
-        self.settings = SettingsManager(
-            name="config", settings_directory=decky.DECKY_PLUGIN_SETTINGS_DIR
-        )
+    """In-memory settings store shared by the whole plugin.
+
+    Reads are served from memory. Writes are coalesced and flushed to disk
+    FLUSH_DELAY seconds after the last change, but no later than
+    FLUSH_MAX_DELAY after the first unsaved one, via write-temp-then-rename.
+    """
+
+    FLUSH_DELAY = 0.5
+    FLUSH_MAX_DELAY = 5.0
+
+    def __init__(self, name: str = "config", directory: Optional[str] = None):
+        directory = directory or decky.DECKY_PLUGIN_SETTINGS_DIR
+        self.path = os.path.join(directory, f"{name}.json")
+        self._data: Dict[str, Any] = self._load()
+        self._subscribers: Dict[str, List[ChangeCallback]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._dirty_since: Optional[float] = None
+        # bumped on every change, lets clients tell whether their copy is stale
+        self.revision = 0
+        if self._apply_schema():
+            self.flush()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"failed to load settings from {self.path}: {e}")
+            return {}
+
+    def _apply_schema(self) -> bool:
+        changed = False
+        for key, default in SCHEMA.items():
+            if key not in self._data:
+                self._data[key] = default
+                changed = True
+                continue
+            try:
+                value = _coerce(key, self._data[key])
+            except (TypeError, ValueError):
+                logger.warning(f"invalid value for {key}: {self._data[key]}, using default")
+                value = default
+            if value != self._data[key] or type(value) is not type(self._data[key]):
+                self._data[key] = value
+                changed = True
+        return changed
 
     def getSetting(self, key: str) -> Any:
-        value = self.settings.getSetting(key)
-        logger.debug(f"getSetting: {key} => {value}")
-        return value
-    
+        return self._data.get(key, SCHEMA.get(key))
+
     def setSetting(self, key: str, value: Any) -> None:
-        logger.debug(f"setSetting: {key} => {value}")
-        self.settings.setSetting(key, value)
+        self.setSettings({key: value})
+
+    def setSettings(self, values: Dict[str, Any]) -> None:
+        """Apply several settings at once, all values are validated first"""
+        coerced = {key: _coerce(key, value) for key, value in values.items()}
+        changed = {
+            key: value
+            for key, value in coerced.items()
+            if key not in self._data or self._data[key] != value
+        }
+        if not changed:
+            return
+        logger.debug("setSettings: %s", changed)
+        self._data.update(changed)
+        self.revision += 1
+        self._schedule_flush()
+        for key, value in changed.items():
+            for callback in self._subscribers.get(key, []):
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    logger.error(f"error in settings subscriber for {key}: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+    def subscribe(self, key: str, callback: ChangeCallback) -> None:
+        self._subscribers.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, key: str, callback: ChangeCallback) -> None:
+        if callback in self._subscribers.get(key, []):
+            self._subscribers[key].remove(callback)
+
+    def _schedule_flush(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        now = loop.time()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        when = min(now + self.FLUSH_DELAY, self._dirty_since + self.FLUSH_MAX_DELAY)
+        self._flush_handle = loop.call_at(when, self.flush)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._dirty_since = None
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"failed to save settings to {self.path}: {e}")
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
@@ -0,0 +1,99 @@
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import decky
+from decky import logger
+from metadata import RESOURCE_TYPE_ENUMS, ResourceType
+from setting import Settings, get_settings
+import versions
+
+SleepFunc = Callable[[float], Awaitable[Any]]
+
+
+class UpdateChecker:
+    """Periodically checks the plugin and core releases in the background.
+
+    An `update_available` event is emitted once per new release, and when
+    `prefetch_update` is on the artifact is downloaded into the cache so a
+    later upgrade only has to install it. `sleep` can be swapped for a fake
+    clock.
+    """
+
+    INITIAL_DELAY = 60.0
+    JITTER = 0.1
+
+    def __init__(
+        self, settings: Optional[Settings] = None, sleep: SleepFunc = asyncio.sleep
+    ):
+        self.settings = settings if settings is not None else get_settings()
+        self._sleep = sleep
+        self._task: Optional[asyncio.Task] = None
+        self._notified: Dict[ResourceType, str] = {}
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    async def _run(self) -> None:
+        await self._sleep(self._jittered(self.INITIAL_DELAY))
+        while True:
+            if self.settings.getSetting("auto_check_update"):
+                await self.check()
+            await self._sleep(
+                self._jittered(float(self.settings.getSetting("update_check_interval")))
+            )
+
+    async def check(self) -> None:
+        for res in RESOURCE_TYPE_ENUMS:
+            try:
+                await self._check(res)
+            except Exception as e:
+                logger.error(f"update check for {res.value} failed with {e}")
+
+    async def _check(self, res: ResourceType) -> None:
+        # a background check must see a new release now, not after the next one
+        latest = await versions.get_latest_version(
+            res,
+            self.settings.getSetting("timeout"),
+            self.settings.getSetting("debounce_time"),
+            stale_ok=False,
+        )
+        current = versions.get_current_version(res)
+        if not versions.is_newer(latest, current):
+            return
+
+        prefetched = False
+        if self.settings.getSetting("prefetch_update"):
+            # the upgrade machinery is only loaded once there is something to fetch
+            import upgrade
+
+            # a failed prefetch must not hold back the notification
+            if not upgrade.is_upgrading(res):
+                try:
+                    await upgrade.prefetch(res, latest)
+                    prefetched = True
+                except Exception as e:
+                    logger.warning(f"prefetch of {res.value} {latest} failed with {e}")
+
+        if self._notified.get(res) == latest:
+            return
+        self._notified[res] = latest
+        logger.info(f"update available: {res.value} {current} -> {latest}")
+        await decky.emit(
+            "update_available",
+            {
+                "res": res.value,
+                "current": current,
+                "latest": latest,
+                "prefetched": prefetched,
+            },
+        )
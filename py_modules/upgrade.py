@@ -1,16 +1,20 @@
 import asyncio
-from enum import Enum
 import os
+import platform
 import shutil
 import stat
-import tempfile
-import time
-from typing import Any, Awaitable, Callable, Coroutine, Dict, Tuple
+import struct
+import sys
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional, Sequence, Tuple
+import zipfile
+import zlib
 
+import cache
 import core
 import decky
 from decky import logger
-from metadata import CORE_REPO, PACKAGE_REPO
+from metadata import PACKAGE_REPO, ResourceType
+import setting
 import utils
 
 
@@ -23,14 +27,6 @@ def remove_no_fail(path: str):
         raise e
 
 
-def get_latest_release_url(repo: str) -> str:
-    return f"https://api.github.com/repos/{repo}/releases/latest"
-
-
-def get_releases_url(repo: str) -> str:
-    return f"https://api.github.com/repos/{repo}/releases"
-
-
 def recursive_chmod(path: str, perms: int) -> None:
     for dirpath, _, filenames in os.walk(path):
         current_perms = os.stat(dirpath).st_mode
@@ -73,13 +69,109 @@ async def restart_plugin_loader() -> None:
         )
 
 
-class ResourceType(Enum):
-    PLUGIN = "plugin"
-    CORE = "core"
+def _file_matches(path: str, info: zipfile.ZipInfo) -> bool:
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+        crc = 0
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+        return crc == info.CRC
+    except FileNotFoundError:
+        return False
+
+
+def _ensure_writable(path: str) -> None:
+    mode = os.stat(path).st_mode
+    if not mode & stat.S_IWUSR:
+        os.chmod(path, mode | stat.S_IWUSR)
+
+
+def sync_zip_to_dir(
+    zip_path: str,
+    prefix: str,
+    dest: str,
+    user: str | int,
+    keep: List[str],
+    required: Sequence[str] = (),
+) -> Tuple[int, int]:
+    """Make dest match the entries under prefix in the zip.
+
+    Only entries whose size or CRC differ from the installed file are written,
+    files missing from the zip are removed. Paths under one of the keep
+    directories are never modified or removed, only created when missing.
+    Nothing is touched unless the zip has entries under prefix and every
+    `required` path relative to it. Returns the number of written and
+    removed files.
+    """
+    keep_dirs = tuple(os.path.join(dest, k) + os.sep for k in keep)
+    written = removed = 0
+    expected = set()
+    writable = set()
+
+    def _prepare_dir(path: str) -> None:
+        if path in writable:
+            return
+        if not os.path.isdir(path):
+            _prepare_dir(os.path.dirname(path))
+            os.mkdir(path)
+            shutil.chown(path, user, user)
+        _ensure_writable(path)
+        writable.add(path)
+
+    with zipfile.ZipFile(zip_path) as zf:
+        entries = [
+            info
+            for info in zf.infolist()
+            if info.filename.startswith(prefix) and not info.is_dir()
+        ]
+        # a zip laid out differently would otherwise empty dest
+        if not entries:
+            raise RuntimeError(f"{os.path.basename(zip_path)} has no entries under {prefix}")
+        names = {info.filename[len(prefix) :] for info in entries}
+        missing = [path for path in required if path not in names]
+        if missing:
+            raise RuntimeError(
+                f"{os.path.basename(zip_path)} is missing {', '.join(missing)} under {prefix}"
+            )
 
+        for info in entries:
+            rel = info.filename[len(prefix) :]
+            target = os.path.normpath(os.path.join(dest, rel))
+            if not target.startswith(dest + os.sep):
+                logger.warning(f"sync_zip_to_dir: skipping unsafe entry {info.filename}")
+                continue
+            expected.add(target)
+            if target.startswith(keep_dirs) and os.path.exists(target):
+                continue
+            if _file_matches(target, info):
+                continue
+
+            _prepare_dir(os.path.dirname(target))
+            tmp_path = target + ".upgrade"
+            with zf.open(info) as src, open(tmp_path, "wb") as out:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            mode = (info.external_attr >> 16) & 0o777 or 0o644
+            os.chmod(tmp_path, mode | stat.S_IWUSR)
+            shutil.chown(tmp_path, user, user)
+            os.replace(tmp_path, target)
+            written += 1
+
+    for dirpath, _, filenames in os.walk(dest):
+        if (dirpath + os.sep).startswith(keep_dirs):
+            continue
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if path not in expected:
+                _prepare_dir(dirpath)
+                os.remove(path)
+                removed += 1
 
-RESOURCE_TYPE_ENUMS = [ResourceType.PLUGIN, ResourceType.CORE]
-RESOURCE_TYPE_VALUES = [e.value for e in RESOURCE_TYPE_ENUMS]
+    return written, removed
 
 
 async def upgrade_plugin(version: str) -> None:
@@ -87,97 +179,168 @@ async def upgrade_plugin(version: str) -> None:
     downloaded_filepath = await download_resourse(ResourceType.PLUGIN, version)
 
     if os.path.exists(downloaded_filepath):
-        plugin_dir = decky.DECKY_PLUGIN_DIR
-
-        logger.debug(f"chmod +w {plugin_dir}")
-        # add write perms to directory
-        await asyncio.to_thread(recursive_chmod, plugin_dir, stat.S_IWUSR)
-
-        # backup binaries
-        binaries_dir = os.path.join(plugin_dir, "bin")
-        backup_binaries_dir = os.path.join(decky.DECKY_PLUGIN_RUNTIME_DIR, "bin_backup")
-        if os.path.exists(binaries_dir):
-            logger.debug(f"backing up to {backup_binaries_dir}")
-            os.makedirs(backup_binaries_dir, exist_ok=True)
-            await asyncio.to_thread(
-                shutil.copytree, binaries_dir, backup_binaries_dir, dirs_exist_ok=True
-            )
+        plugin_dir = os.path.normpath(decky.DECKY_PLUGIN_DIR)
+        prefix = os.path.basename(plugin_dir) + "/"
+
+        logger.debug(f"syncing ota file to {plugin_dir}")
+        written, removed = await asyncio.to_thread(
+            sync_zip_to_dir,
+            downloaded_filepath,
+            prefix,
+            plugin_dir,
+            decky.DECKY_USER,
+            ["bin"],
+            ["main.py", "plugin.json"],
+        )
+        logger.debug(f"upgrade_plugin: {written} files written, {removed} removed")
 
-        # remove old plugin
-        await asyncio.to_thread(shutil.rmtree, plugin_dir)
+        logger.info("upgrade_plugin: complete")
+        await restart_plugin_loader()
 
-        logger.debug(f"extracting ota file to {plugin_dir}")
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            await asyncio.to_thread(
-                shutil.unpack_archive, downloaded_filepath, tmp_dir, format="zip"
-            )
-            await asyncio.to_thread(
-                shutil.copytree,
-                os.path.join(tmp_dir, os.path.basename(decky.DECKY_PLUGIN_DIR)),
-                plugin_dir,
-                dirs_exist_ok=True,
-            )
 
-        # recover old binaries
-        if os.path.exists(backup_binaries_dir):
-            logger.debug(f"recovering old binaries")
-            await asyncio.to_thread(
-                shutil.copytree, backup_binaries_dir, binaries_dir, dirs_exist_ok=True
-            )
-            await asyncio.to_thread(shutil.rmtree, backup_binaries_dir)
+CORE_HEALTH_WINDOW = 5.0
 
-        await asyncio.to_thread(
-            recursive_chmod, binaries_dir, stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
-        )
-        await asyncio.to_thread(
-            recursive_chown, decky.DECKY_PLUGIN_DIR, decky.DECKY_USER, decky.DECKY_USER
-        )
+_core_controller: Optional[core.CoreController] = None
 
-        # cleanup downloaded files
-        logger.debug(f"cleaning up")
-        remove_no_fail(downloaded_filepath)
 
-        logger.info("upgrade_plugin: complete")
-        await restart_plugin_loader()
+def set_core_controller(controller: Optional[core.CoreController]) -> None:
+    global _core_controller
+    _core_controller = controller
+
+
+def _core_slot_path(version: str) -> str:
+    return os.path.join(
+        core.CoreController.SLOTS_DIR, utils.sanitize_filename(version), "natpierce"
+    )
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _swap_core(slot_path: str) -> None:
+    """Atomically point CORE_PATH at the binary in slot_path"""
+    core_path = core.CoreController.CORE_PATH
+    tmp_path = core_path + ".swap"
+    remove_no_fail(tmp_path)
+    _link_or_copy(slot_path, tmp_path)
+    os.replace(tmp_path, core_path)
+
+
+def _preserve_current_core(slot_name: str) -> Optional[str]:
+    """Keep the installed core in a slot so it can be rolled back to"""
+    core_path = core.CoreController.CORE_PATH
+    if not os.path.exists(core_path):
+        return None
+    slot_path = _core_slot_path(slot_name or "previous")
+    if os.path.exists(slot_path) and os.path.samefile(slot_path, core_path):
+        return slot_path
+    os.makedirs(os.path.dirname(slot_path), exist_ok=True)
+    remove_no_fail(slot_path)
+    _link_or_copy(core_path, slot_path)
+    return slot_path
+
+
+def _prune_core_slots(keep: List[str]) -> None:
+    slots_dir = core.CoreController.SLOTS_DIR
+    keep_dirs = {os.path.dirname(path) for path in keep}
+    for name in os.listdir(slots_dir):
+        path = os.path.join(slots_dir, name)
+        if path not in keep_dirs:
+            logger.debug(f"removing old core slot {path}")
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# e_machine values of the ELF header, see elf.h
+_ELF_MACHINES = {
+    "x86_64": 62,
+    "amd64": 62,
+    "aarch64": 183,
+    "arm64": 183,
+    "i386": 3,
+    "i686": 3,
+    "armv7l": 40,
+    "riscv64": 243,
+}
+_ELF_HEADER = struct.Struct("<4sBBBxxxxxxxxxHH")
+_ET_EXEC = 2
+_ET_DYN = 3
+
+
+def _check_core_binary(path: str) -> None:
+    """Make sure the file at path is an ELF executable for this machine,
+    without running it, a running probe would start a second core"""
+    with open(path, "rb") as f:
+        header = f.read(_ELF_HEADER.size)
+    if len(header) < _ELF_HEADER.size or not header.startswith(b"\x7fELF"):
+        raise RuntimeError(f"core {path} is not an ELF executable")
+    _, ei_class, ei_data, _, e_type, e_machine = _ELF_HEADER.unpack(header)
+    if ei_data != 1:
+        raise RuntimeError(f"core {path} is not a little endian binary")
+    if e_type not in (_ET_EXEC, _ET_DYN):
+        raise RuntimeError(f"core {path} is not an executable, ELF type {e_type}")
+    machine = platform.machine().lower()
+    expected = _ELF_MACHINES.get(machine)
+    if expected is None:
+        logger.warning(f"unknown machine {machine}, skipping core architecture check")
+    elif e_machine != expected:
+        raise RuntimeError(
+            f"core {path} is built for ELF machine {e_machine}, this system is {machine}"
+        )
+    elif ei_class != (2 if sys.maxsize > 2**32 else 1):
+        raise RuntimeError(f"core {path} does not match this system's word size")
 
 
 async def upgrade_core(version: str) -> None:
     logger.info("upgrade_core: upgrading")
-    downloaded_filepath = await download_resourse(ResourceType.CORE, version)
-    core_path = core.CoreController.CORE_PATH
-    settings = core.Settings()
+    settings = setting.get_settings()
+    current_version = settings.getSetting("core_version") or ""
+    slot_path = _core_slot_path(version)
+    staging_path = slot_path + ".new"
+
+    ensure_bin_dir()
+    os.makedirs(os.path.dirname(slot_path), exist_ok=True)
+    cached = await download_resourse(ResourceType.CORE, version)
+    logger.debug(f"staging core at {staging_path}")
+    await asyncio.to_thread(shutil.copyfile, cached, staging_path)
+
+    os.chmod(staging_path, 0o755)
+    shutil.chown(staging_path, decky.DECKY_USER, decky.DECKY_USER)
+    try:
+        _check_core_binary(staging_path)
+    except Exception:
+        remove_no_fail(staging_path)
+        raise
+    previous_slot = _preserve_current_core(
+        current_version if current_version != version else "previous"
+    )
+    os.replace(staging_path, slot_path)
 
-    if os.path.exists(downloaded_filepath):
-        ensure_bin_dir()
-        logger.debug(f"removing old core from {core_path}")
-        # remove core plugin
-        remove_no_fail(core_path)
-
-        logger.debug(f"extracting core to {core_path}")
-
-        def _impl():
-            import tempfile
-            import glob
-            
-            with tempfile.TemporaryDirectory() as temp_dir:
-                shutil.unpack_archive(downloaded_filepath, temp_dir, format="gztar")
-                
-                # Find natpierce executable
-                natpierce_files = glob.glob(os.path.join(temp_dir, "**/natpierce"), recursive=True)
-                if natpierce_files:
-                    shutil.copy2(natpierce_files[0], core_path)
-                else:
-                    raise FileNotFoundError("natpierce executable not found")
-
-        await asyncio.to_thread(_impl)
-        os.chmod(core_path, 0o755)
-        shutil.chown(core_path, decky.DECKY_USER, decky.DECKY_USER)
-        # cleanup downloaded files
-        remove_no_fail(downloaded_filepath)
-
-        settings.setSetting("core_version", version)
-
-        logger.info("upgrade_core: complete")
+    controller = _core_controller
+    was_running = controller is not None and controller.is_running
+
+    logger.debug(f"swapping core to {slot_path}")
+    _swap_core(slot_path)
+    if controller is not None and was_running:
+        try:
+            await controller.restart()
+            returncode = await controller.wait_exit(CORE_HEALTH_WINDOW)
+            if returncode is not None:
+                raise RuntimeError(f"new core exited with code {returncode}")
+        except Exception as e:
+            logger.error(f"upgrade_core: {e}, rolling back")
+            if previous_slot is not None:
+                _swap_core(previous_slot)
+                await controller.restart()
+            raise RuntimeError(f"core {version} failed health check: {e}")
+
+    settings.setSetting("core_version", version)
+    _prune_core_slots([p for p in (slot_path, previous_slot) if p is not None])
+
+    logger.info("upgrade_core: complete")
 
 
 _FUNC_MAP: Dict[ResourceType, Callable[[str], Coroutine[Any, Any, None]]] = {
@@ -191,15 +354,107 @@ _URL_MAP: Dict[ResourceType, Callable[[str], str]] = {
 }
 
 
-async def download_resourse(res: ResourceType, version: str) -> str:
-    url = _URL_MAP[res](version)
-    name = url.split("/")[-1]
+def _progress_emitter(res: ResourceType) -> utils.ProgressCallback:
     event = f"dl_{res.value}_progress"
 
     def emitter(percent: int) -> Awaitable:
         return decky.emit(event, percent)
 
-    return await utils.download_with_progress(url, name, emitter)
+    return emitter
+
+
+_cache: Optional[cache.DownloadCache] = None
+
+
+def _get_cache() -> cache.DownloadCache:
+    global _cache
+    if _cache is None:
+        _cache = cache.DownloadCache()
+    return _cache
+
+
+async def _no_progress(percent: int) -> None:
+    pass
+
+
+class _SharedFetch:
+    """One in-flight download of an artifact, joined by everyone who needs
+    it, each with its own progress callback"""
+
+    def __init__(self):
+        self.listeners: List[utils.ProgressCallback] = []
+        self.task: Optional[asyncio.Task] = None
+
+    async def progress(self, percent: int) -> None:
+        for listener in list(self.listeners):
+            await listener(percent)
+
+
+_fetches: Dict[Tuple[ResourceType, str], _SharedFetch] = {}
+
+
+async def _fetch_artifact(
+    res: ResourceType, version: str, emitter: utils.ProgressCallback
+) -> str:
+    """Download the artifact into the cache and return the cached path"""
+    import downloader
+
+    url = _URL_MAP[res](version)
+    if res == ResourceType.CORE:
+        # the core is cached as the extracted binary rather than the tarball
+        os.makedirs(downloader.DOWNLOAD_DIR, exist_ok=True)
+        tmp_path = os.path.join(
+            downloader.DOWNLOAD_DIR, f"natpierce-{utils.sanitize_filename(version)}.extract"
+        )
+        await downloader.stream_extract_member(url, "natpierce", tmp_path, emitter)
+        downloaded = tmp_path
+    else:
+        downloaded = await downloader.download_with_progress(url, url.split("/")[-1], emitter)
+    return await asyncio.to_thread(_get_cache().store, url, version, downloaded, True)
+
+
+async def download_resourse(
+    res: ResourceType, version: str, emitter: Optional[utils.ProgressCallback] = None
+) -> str:
+    """Return the path of the verified, cached artifact for res at version.
+
+    Concurrent calls for the same artifact, e.g. an upgrade started during
+    a background prefetch, share one download. It is cancelled once every
+    caller waiting for it is cancelled.
+    """
+    url = _URL_MAP[res](version)
+    if emitter is None:
+        emitter = _progress_emitter(res)
+    cached = await asyncio.to_thread(_get_cache().lookup, url, version)
+    if cached is not None:
+        await emitter(-1)
+        return cached
+
+    key = (res, version)
+    fetch = _fetches.get(key)
+    if fetch is None:
+        fetch = _fetches[key] = _SharedFetch()
+        fetch.task = asyncio.create_task(_fetch_artifact(res, version, fetch.progress))
+        fetch.task.add_done_callback(
+            lambda _: _fetches.pop(key) if _fetches.get(key) is fetch else None
+        )
+    else:
+        logger.debug(f"joining the download of {res.value} {version}")
+    assert fetch.task is not None
+    fetch.listeners.append(emitter)
+    try:
+        return await asyncio.shield(fetch.task)
+    finally:
+        fetch.listeners.remove(emitter)
+        if not fetch.listeners and not fetch.task.done():
+            fetch.task.cancel()
+
+
+async def prefetch(res: ResourceType, version: str) -> None:
+    """Download the artifact for res at version into the cache without
+    installing it or emitting progress events"""
+    logger.info(f"prefetch: {res.value} {version}")
+    await download_resourse(res, version, _no_progress)
 
 
 _upgrade_tasks: Dict[ResourceType, asyncio.Task] = {}
@@ -236,36 +491,6 @@ def cancel_upgrade(res: ResourceType) -> None:
     logger.info(f"cancel_upgrade: {res.value} {rtn}")
 
 
-_REPO_MAP: Dict[ResourceType, str] = {
-    ResourceType.CORE: CORE_REPO,
-    ResourceType.PLUGIN: PACKAGE_REPO,
-}
-_query_history: Dict[ResourceType, Tuple[str, float]] = {}
-
-
-async def get_latest_version(
-    res: ResourceType, timeout: float, debounce_time: float
-) -> str:
-    if res in _query_history:
-        last_query, last_time = _query_history[res]
-        if time.time() - last_time <= debounce_time:
-            return last_query
-
-    if res == ResourceType.CORE:
-        url = "https://www.natpierce.cn/tempdir/info/version.html"
-        tag = await utils.get_url_to_text(url, timeout=timeout)
-        if not tag.strip().startswith("v"):
-            tag = "v" + tag.strip()
-    else:
-        json_data = await utils.get_url_to_json(
-            get_latest_release_url(_REPO_MAP[res]), timeout=timeout
-        )
-        tag = json_data.get("tag_name")
-
-    _query_history[res] = (tag, time.time())
-    return tag
-
-
 def initialize_plugin() -> None:
     recursive_chmod(os.path.join(decky.DECKY_PLUGIN_DIR, "bin"), 0o755)
     data_path = os.path.join(decky.DECKY_PLUGIN_DIR, "data")
@@ -1,65 +1,58 @@
 import asyncio
 import base64
-import json
 import os
 import random
 import re
 import ssl
-import tempfile
-import urllib.request
 import fcntl
 import struct
 import socket
-from typing import Any, Awaitable, Callable, List, Optional
-
-import aiohttp
+import time
+from typing import Awaitable, Callable, List, Optional
 
 from decky import logger
 
-_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 SIOCGIFADDR = 0x8915
-_sockfd = _sock.fileno()
+_sock: Optional[socket.socket] = None
+
+
+def _get_sockfd() -> int:
+    global _sock
+    if _sock is None:
+        _sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    return _sock.fileno()
 
 
+CA_BUNDLE = '/etc/ssl/certs/ca-bundle.crt'
+_ssl_disable_verify = False
+_ssl_context: Optional[ssl.SSLContext] = None
+
 def init_ssl_context(disable_verify: bool) -> None:
-    global _ssl_context
+    # loading the CA bundle is deferred to the first request
+    global _ssl_context, _ssl_disable_verify
+    _ssl_disable_verify = disable_verify
+    _ssl_context = None
     if disable_verify:
         logger.warning("SSL verification is disabled")
-        _ssl_context = ssl._create_unverified_context()
-    else:
-        _ssl_context = ssl.create_default_context(cafile='/etc/ssl/certs/ca-bundle.crt')
 
 def get_ssl_context() -> ssl.SSLContext:
+    global _ssl_context
+    if _ssl_context is None:
+        if _ssl_disable_verify:
+            _ssl_context = ssl._create_unverified_context()
+        elif os.path.exists(CA_BUNDLE):
+            _ssl_context = ssl.create_default_context(cafile=CA_BUNDLE)
+        else:
+            _ssl_context = ssl.create_default_context()
     return _ssl_context
 
-async def get_url_to_text(url: str | urllib.request.Request, timeout: Optional[float] = None) -> str:
-    return (await asyncio.to_thread(
-        lambda: urllib.request.urlopen(url, context=_ssl_context, timeout=timeout).read().decode(),
-    ))
-
-async def get_url_to_json(url: str | urllib.request.Request, timeout: Optional[float] = None) -> Any:
-    return (await asyncio.to_thread(
-        lambda: json.load(urllib.request.urlopen(url, context=_ssl_context, timeout=timeout)),
-    ))
-
-async def get_url_to_file(url: str | urllib.request.Request, dest: str, timeout: Optional[float] = None) -> None:
-    def _impl():
-        with urllib.request.urlopen(url, timeout=timeout, context=_ssl_context) as response:
-            data = response.read()
-        if os.path.exists(dest):
-            logger.debug(f"get_url_to_file: removing {dest}")
-            os.remove(dest)
-        with open(dest, 'wb') as out:
-            out.write(data)
-    await asyncio.to_thread(_impl)
-
 def rand_thing() -> str:
     return base64.urlsafe_b64encode(random.randbytes(8)).decode()[:-1]
 
 def get_ip_by_iface(iface: str) -> Optional[str]:
     ifreq = struct.pack('16sH14s', iface.encode(), socket.AF_INET, b'\x00'*14)
     try:
-        res = fcntl.ioctl(_sockfd, SIOCGIFADDR, ifreq)
+        res = fcntl.ioctl(_get_sockfd(), SIOCGIFADDR, ifreq)
     except Exception as e:
         logger.error(f'get_ip_by_iface: failed to get IP address by {iface} with {e}')
         return None
@@ -101,6 +94,45 @@ def get_ip() -> str:
         return ip
     return '127.0.0.1'
 
+def is_port_free(port: int, host: str = "0.0.0.0") -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+async def wait_port_free(port: int, timeout: float, interval: float = 0.1) -> bool:
+    deadline = time.monotonic() + timeout
+    while not is_port_free(port):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(interval)
+    return True
+
+def find_free_port(start: int, end: int, preferred: Optional[int] = None) -> Optional[int]:
+    """First bindable port in [start, end], trying preferred first"""
+    if preferred is not None and start <= preferred <= end and is_port_free(preferred):
+        return preferred
+    for port in range(start, end + 1):
+        if port != preferred and is_port_free(port):
+            return port
+    return None
+
+async def probe_port(port: int, host: str = "127.0.0.1", timeout: float = 0.5) -> bool:
+    """True if something accepts TCP connections on host:port"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
 def sanitize_filename(name: str) -> str:
     return re.sub('[/]', '-', name)
 
@@ -110,28 +142,3 @@ def env_fix() -> dict[str, str]:
     return current_env
 
 ProgressCallback = Callable[[int], Awaitable]
-async def download_with_progress(url: str, name: str, progress_callback: ProgressCallback) -> str:
-    with tempfile.NamedTemporaryFile("wb", suffix=name, delete=False) as f:
-        logger.debug(f"downloading: {url} to {f.name}")
-        downloaded_size = 0
-        last_percent = 0
-        await progress_callback(0)
-        async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=get_ssl_context()),
-            timeout=aiohttp.ClientTimeout(0)) as session:
-            async with session.get(url) as response:
-                total_size = int(response.headers.get("Content-Length", 0))
-                logger.debug(f"downloading: {total_size} bytes")
-                while True:
-                    chunk = await response.content.read(128*1024)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    downloaded_size += len(chunk)
-                    percent = int(downloaded_size / total_size * 100)
-                    if percent > last_percent:
-                        last_percent = percent
-                        logger.debug(f"downloading: {percent}%")
-                        await progress_callback(last_percent)
-        await progress_callback(-1)
-        return f.name
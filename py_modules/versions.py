@@ -0,0 +1,90 @@
+import itertools
+import json
+from typing import Dict, Optional, Tuple
+
+import decky
+from metadata import CORE_REPO, PACKAGE_REPO, ResourceType
+import release_cache
+import setting
+
+# kept apart from upgrade, which pulls in zipfile, cache and core, so the
+# panel can read versions without loading the upgrade machinery
+
+CORE_VERSION_URL = "https://www.natpierce.cn/tempdir/info/version.html"
+
+_REPO_MAP: Dict[ResourceType, str] = {
+    ResourceType.CORE: CORE_REPO,
+    ResourceType.PLUGIN: PACKAGE_REPO,
+}
+
+
+def get_latest_release_url(repo: str) -> str:
+    return f"https://api.github.com/repos/{repo}/releases/latest"
+
+
+def get_releases_url(repo: str) -> str:
+    return f"https://api.github.com/repos/{repo}/releases"
+
+
+def get_current_version(res: ResourceType) -> str:
+    if res == ResourceType.PLUGIN:
+        version = decky.DECKY_PLUGIN_VERSION
+        if version and version[0].isdigit():
+            version = "v" + version
+        return version
+    return setting.get_settings().getSetting("core_version") or ""
+
+
+def parse_version(version: str) -> Tuple[int, ...]:
+    parts = []
+    for part in version.strip().lstrip("vV").split("."):
+        digits = "".join(itertools.takewhile(str.isdigit, part))
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+def is_newer(latest: str, current: str) -> bool:
+    if not latest:
+        return False
+    if not current:
+        return True
+    return parse_version(latest) > parse_version(current)
+
+
+_release_cache: Optional[release_cache.ReleaseCache] = None
+
+
+def get_release_cache() -> release_cache.ReleaseCache:
+    global _release_cache
+    if _release_cache is None:
+        _release_cache = release_cache.ReleaseCache()
+    return _release_cache
+
+
+def _parse_core_version(text: str) -> str:
+    tag = text.strip()
+    if not tag.startswith("v"):
+        tag = "v" + tag
+    return tag
+
+
+def _parse_github_release(text: str) -> str:
+    return json.loads(text).get("tag_name")
+
+
+def get_cached_latest_version(res: ResourceType) -> str:
+    return get_release_cache().peek(res.value)
+
+
+async def get_latest_version(
+    res: ResourceType, timeout: float, debounce_time: float, stale_ok: bool = True
+) -> str:
+    """The latest release tag, a stale cached tag is returned at once and
+    refreshed in the background unless stale_ok is False"""
+    if res == ResourceType.CORE:
+        url, parse = CORE_VERSION_URL, _parse_core_version
+    else:
+        url, parse = get_latest_release_url(_REPO_MAP[res]), _parse_github_release
+    return await get_release_cache().get(
+        res.value, url, parse, timeout, debounce_time, stale_ok
+    )
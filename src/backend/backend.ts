@@ -1,13 +1,21 @@
 import { callable } from "@decky/api";
-import { Config, ResourceType } from ".";
+import { Config, CoreLogPage, CoreState, HealthReport, InstrumentationSnapshot, LatencyReport, MetricsReport, NetworkInfo, PanelState, PrecheckReport, ResourceType, Span } from ".";
 
 export const getCoreStatus = callable<[], boolean>("get_core_status");
+export const getCoreState = callable<[], CoreState>("get_core_state");
+export const getCoreLog = callable<[number | null, number], CoreLogPage>("get_core_log");
+export const getHealth = callable<[boolean], HealthReport>("get_health");
+export const getMetrics = callable<[number], MetricsReport>("get_metrics");
+export const setGameRunning = callable<[boolean], void>("set_game_running");
+export const getPrecheckReport = callable<[boolean], PrecheckReport>("get_precheck_report");
 export const setCoreStatus = callable<[boolean], [boolean, string]>("set_core_status");
 export const restartCore = callable<[], boolean>("restart_core");
 
 export const getConfig = callable<[], Config>("get_config");
 export const getConfigValue = callable<[string], any>("get_config_value");
-export const setConfigValue = callable<[string, any], []>("set_config_value");
+export const setConfigValue = callable<[string, any], [boolean, string]>("set_config_value");
+export const setConfigValues = callable<[Record<string, any>], [boolean, string]>("set_config_values");
+export const getState = callable<[], PanelState>("get_state");
 
 export const checkUpdate = callable<[], []>("check_update");
 export const upgrade = callable<[ResourceType, string | undefined], [boolean, string]>("upgrade");
@@ -17,3 +25,8 @@ export const getLatestVersion = callable<[ResourceType], string>("get_latest_ver
 export const isUpgrading = callable<[ResourceType], boolean>("is_upgrading");
 
 export const getIP = callable<[], string>("get_ip");
+export const getLatency = callable<[boolean, boolean], LatencyReport>("get_latency");
+export const getNetworkInfo = callable<[], NetworkInfo>("get_network_info");
+
+export const getInstrumentation = callable<[boolean], InstrumentationSnapshot>("get_instrumentation");
+export const getRecentSpans = callable<[number], Span[]>("get_recent_spans");
@@ -3,9 +3,168 @@ export enum ResourceType {
   CORE = "core",
 }
 
+export interface CoreState {
+  state: "stopped" | "starting" | "prechecking" | "running" | "degraded" | "stopping" | "exited" | "restarting",
+  since: number,
+  running: boolean,
+  pid: number | null,
+  exit_code: number | null,
+  last_error: string | null,
+  command: string[],
+  uptime: number,
+  restart_count: number,
+  last_exit_code: number | null,
+  crash_loop: boolean,
+  port: number | null,
+}
+
+export interface HealthCheck {
+  time: number,
+  ok: boolean,
+  message: string,
+  tcp: boolean,
+  http: boolean,
+  latency: number | null,
+  tun: string | null,
+  rx_bytes: number,
+  tx_bytes: number,
+}
+
+export interface HealthReport {
+  status: "unknown" | "healthy" | "degraded",
+  failures: number,
+  latency: number | null,
+  latency_avg: number | null,
+  idle_for: number | null,
+  history: HealthCheck[],
+}
+
+export interface MetricsSample {
+  time: number,
+  cpu_percent: number,
+  rss: number,
+  threads: number,
+  read_bps: number,
+  write_bps: number,
+  rx_bps: number,
+  tx_bps: number,
+  rx_pps: number,
+  tx_pps: number,
+}
+
+export interface MetricsReport {
+  pid: number | null,
+  interval: number,
+  latest: MetricsSample | null,
+  samples: MetricsSample[],
+}
+
+export interface PrecheckResult {
+  name: string,
+  ok: boolean,
+  message: string,
+  cached: boolean,
+  duration: number,
+}
+
+export interface PrecheckReport {
+  ok?: boolean,
+  time?: number,
+  duration?: number,
+  probes?: PrecheckResult[],
+}
+
+export interface CoreLogPage {
+  lines: { seq: number, text: string }[],
+  first_seq: number,
+  last_seq: number,
+}
+
 export interface Config {
   status: boolean,
   controller_port: number,
   autostart: boolean,
   costom_port: boolean,
+  port?: number | null,
+  supervise?: boolean,
+  restart_count?: number,
+  last_exit_code?: number | null,
+  uptime?: number,
+}
+
+export interface InterfaceAddress {
+  ifname: string,
+  index: number,
+  family: 4 | 6,
+  address: string,
+  prefixlen: number,
+  scope: number,
+  tun: boolean,
+}
+
+export interface NetworkInfo {
+  ip: string | null,
+  tun: InterfaceAddress[],
+  addresses: InterfaceAddress[],
+}
+
+export interface LatencyStats {
+  count: number,
+  lost: number,
+  loss: number,
+  min: number | null,
+  max: number | null,
+  avg: number | null,
+  last: number | null,
+  p50: number | null,
+  p95: number | null,
+  p99: number | null,
+}
+
+export interface LatencyTarget {
+  name: string,
+  kind: "core" | "peer",
+  host: string,
+  port: number,
+  ifname?: string,
+  tcp: LatencyStats,
+  udp: LatencyStats | null,
+}
+
+export interface LatencyReport {
+  time: number | null,
+  targets: LatencyTarget[],
+}
+
+export interface CallStats {
+  calls: number,
+  errors: number,
+  avg_ms: number | null,
+  max_ms: number | null,
+  p50_ms: number | null,
+  p95_ms: number | null,
+  p99_ms: number | null,
+}
+
+export interface InstrumentationSnapshot {
+  enabled: boolean,
+  span_log: string | null,
+  stats: Record<string, CallStats>,
+}
+
+export interface Span {
+  name: string,
+  time: number,
+  ms: number,
+  error?: string,
+}
+
+export interface PanelState {
+  stamp: string,
+  config: Config,
+  settings: Record<string, any>,
+  core: CoreState,
+  version: Record<ResourceType, string>,
+  latest_version: Record<ResourceType, string>,
+  ip: string,
 }
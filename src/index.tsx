@@ -13,7 +13,9 @@ import {
   TextField,
 } from "@decky/ui";
 import {
+  addEventListener,
   definePlugin,
+  removeEventListener,
   toaster,
   routerHook
 } from "@decky/api"
@@ -23,13 +25,14 @@ import { t } from "i18next";
 import { About, Upgrade } from "./pages";
 import { DeckyNatpierceIcon, DefautlPort } from "./global";
 import { ActionButtonItem, InstallationGuide } from "./components";
-import { backend, Config, ResourceType } from "./backend";
+import { backend, Config, CoreState, NetworkInfo, ResourceType } from "./backend";
 import { QRCodeCanvas } from "qrcode.react";
 
 const Content: FC = () => {
   const keyConfig = "decky-natpierce-config";
   const keyIP = "decky-natpierce-ip";
   const keyShowRemoteAccessQR = "decky-natpierce-show-remote-access-qr";
+  const keyLatestVersion = "decky-natpierce-latest-version";
 
   const localConfig: Config = JSON.parse(window.localStorage.getItem(keyConfig) || "{}");
   const localIP = window.localStorage.getItem(keyIP) || "";
@@ -50,6 +53,7 @@ const Content: FC = () => {
   const [autostart, setAutostart] = useState(localConfig.autostart);
   const [controllerPort, setControllerPort] = useState(localConfig.controller_port);
   const [costomPort, setCostomPort] = useState(localConfig.costom_port);
+  const [activePort, setActivePort] = useState<number | null>(null);
   const [qrPageUrl, setQrPageUrl] = useState<string>("");
   const [showRemoteAccessQR, setShowRemoteAccessQR] = useState(Boolean(localShowRemoteAccessQR));
 
@@ -76,13 +80,6 @@ const Content: FC = () => {
     return [_coreVersion];
   };
 
-  useEffect(() => {
-    refreshVersions().then(([_coreVersion]) => {
-      if (_coreVersion === "")
-        setInstallGuide(true);
-    });
-  }, []);
-
   const applyConfig = (config: Config, save: boolean = true) => {
     if (save) {
       window.localStorage.setItem(keyConfig, JSON.stringify(config));
@@ -96,36 +93,30 @@ const Content: FC = () => {
     setAutostart(config.autostart);
     setControllerPort(config.controller_port);
     setCostomPort(config.costom_port);
+    setActivePort(config.port ?? null);
   }
 
-  const fetchConfig = async () => {
+  const fetchAllConfig = async () => {
     setInitialized(false);
-    const config = await backend.getConfig();
-    console.log(config);
-    applyConfig(config);
+    const state = await backend.getState();
+    console.log(state);
+    applyConfig(state.config);
+    setCoreVersion(state.version[ResourceType.CORE]);
+    setPluginVersion(state.version[ResourceType.PLUGIN]);
+    if (state.version[ResourceType.CORE] === "")
+      setInstallGuide(true);
+    window.localStorage.setItem(keyLatestVersion, JSON.stringify(state.latest_version));
+    setCurrentIP(state.ip);
+    window.localStorage.setItem(keyIP, state.ip);
     setInitialized(true);
-  };
-
-  const fetchIP = async () => {
-    const ip = await backend.getIP();
-    console.log(ip);
-    setCurrentIP(ip);
-    window.localStorage.setItem(keyIP, ip);
-  };
-
-  const fetchAllConfig = async () => {
-    await Promise.all([
-      fetchConfig(),
-      fetchIP(),
-    ]);
   }
 
   useEffect(() => {
     if (currentIP) {
-      setQrPageUrl(`http://${currentIP}:${costomPort ? controllerPort : DefautlPort}`)
+      setQrPageUrl(`http://${currentIP}:${activePort ?? (costomPort ? controllerPort : DefautlPort)}`)
     }
   },
-    [currentIP, controllerPort, costomPort]
+    [currentIP, controllerPort, costomPort, activePort]
   );
 
   const getCurrentConfig = (): Config => {
@@ -145,6 +136,32 @@ const Content: FC = () => {
 
   useLayoutEffect(() => { fetchAllConfig(); }, []);
 
+  useEffect(() => {
+    const callback = (state: CoreState) => {
+      if (!natpierceStateChanging) {
+        setNatpierceState(state.running);
+      }
+      setActivePort(state.port);
+    };
+    addEventListener("core_state", callback);
+    return () => {
+      removeEventListener("core_state", callback);
+    };
+  }, [natpierceStateChanging]);
+
+  useEffect(() => {
+    const callback = (info: NetworkInfo) => {
+      if (info.ip) {
+        setCurrentIP(info.ip);
+        window.localStorage.setItem(keyIP, info.ip);
+      }
+    };
+    addEventListener("ip_changed", callback);
+    return () => {
+      removeEventListener("ip_changed", callback);
+    };
+  }, []);
+
   return (installGuide ?
     <InstallationGuide
       coreVersion={coreVersion}
@@ -197,7 +214,7 @@ const Content: FC = () => {
             onClick={() => {
               Router.CloseSideMenus();
               Navigation.NavigateToExternalWeb(
-                `http://127.0.0.1:${controllerPort}`
+                `http://127.0.0.1:${activePort ?? (costomPort ? controllerPort : DefautlPort)}`
               );
             }}
             disabled={natpierceStateChanging || !natpierceState}
@@ -392,6 +409,12 @@ const DeckyPluginRouter: FC = () => {
 export default definePlugin(() => {
   localizationManager.init();
   routerHook.addRoute("/decky-natpierce", DeckyPluginRouter);
+  // lets the backend switch the core to its game mode resource policy
+  const appLifetime = SteamClient.GameSessions.RegisterForAppLifetimeNotifications(
+    (notification: { bRunning: boolean }) => {
+      backend.setGameRunning(notification.bRunning);
+    }
+  );
 
   return {
     name: "DeckyNatpierce",
@@ -400,6 +423,7 @@ export default definePlugin(() => {
     icon: <DeckyNatpierceIcon />,
     onDismount() {
       console.log("Unloading")
+      appLifetime.unregister();
     },
   };
 });
@@ -8,10 +8,18 @@ import { BsCheckCircleFill, BsExclamationCircleFill } from "react-icons/bs";
 import { UpgradeItem } from "../components";
 
 export const Upgrade: FC = () => {
+  // the last known tags from the panel's get_state, refreshed below
+  const cachedLatest: Partial<Record<ResourceType, string>> = JSON.parse(
+    window.localStorage.getItem("decky-natpierce-latest-version") || "{}"
+  );
   const [pluginCurrent, setPluginCurrent] = useState<string>();
-  const [pluginLatest, setPluginLatest] = useState<string>();
+  const [pluginLatest, setPluginLatest] = useState<string | undefined>(
+    cachedLatest[ResourceType.PLUGIN] || undefined
+  );
   const [coreCurrent, setCoreCurrent] = useState<string>();
-  const [coreLatest, setCoreLatest] = useState<string>();
+  const [coreLatest, setCoreLatest] = useState<string | undefined>(
+    cachedLatest[ResourceType.CORE] || undefined
+  );
   const [channel, setChannel] = useState<string>(
     window.localStorage.getItem("decky-natpierce-upgrade-channel") || "latest"
   );